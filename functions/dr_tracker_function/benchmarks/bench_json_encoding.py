@@ -0,0 +1,54 @@
+"""JSON encoding and response compression for a patient history of 100 visits with 4 medicines each."""
+import flask
+
+import main
+from benchmarks.common import report, time_calls
+from tests.fake_catalyst import FakeCatalyst
+
+VISITS = 100
+MEDICINES_PER_VISIT = 4
+REPEAT = 200
+ENCODINGS = ['identity', 'gzip', 'deflate']
+
+
+def _seed(catalyst):
+    catalyst.db.insert('Patient', [{'Name': 'A', 'Phonenumber': '111', 'UUID': 'p-1'}])
+    catalyst.db.insert('Prescription', [{
+        'UUID': f'rx-{i}',
+        'PatientUUID': 'p-1',
+        'CurrentSymptoms': f'Fever, headache and body ache for {i} days',
+        'OutsideMedicines': 'Vitamin C',
+        'fees': '500',
+    } for i in range(VISITS)])
+    catalyst.db.insert('PrescribedMedicine', [{
+        'PrescriptionUUID': f'rx-{i}',
+        'MedicineName': f'Medicine {j}',
+        'frequency': 'Twice daily',
+        'Duration': '7',
+        'timing': 'After food',
+    } for i in range(VISITS) for j in range(MEDICINES_PER_VISIT)])
+
+
+def run():
+    catalyst = FakeCatalyst().install()
+    _seed(catalyst)
+    payload = catalyst.request('GET', '/prescription/patient/p-1').get_json()
+
+    encoders = [('stdlib json', main._encode_json_stdlib)]
+    if main.orjson is not None:
+        encoders.append(('orjson', main._encode_json_orjson))
+    with catalyst.flask_app.app_context():
+        encoders.append(('flask.jsonify', lambda p: flask.jsonify(p).get_data()))
+        for label, encode in encoders:
+            mean_ms, p95_ms = time_calls(lambda: encode(payload), REPEAT)
+            report(f'encode with {label}', mean_ms, p95_ms, f'{len(encode(payload))} bytes')
+
+    for encoding in ENCODINGS:
+        headers = {'Accept-Encoding': encoding}
+        response = catalyst.request('GET', '/prescription/patient/p-1', headers=headers)
+        mean_ms, p95_ms = time_calls(lambda: catalyst.request('GET', '/prescription/patient/p-1', headers=headers), REPEAT)
+        report(f'request, Accept-Encoding: {encoding}', mean_ms, p95_ms, f'{len(response.get_data())} bytes on the wire')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,30 @@
+"""Offset vs cursor paging of GET /all, at page 1 and page 500 of 100,000 patients."""
+import main
+from benchmarks.common import report, time_calls
+from tests.fake_catalyst import FakeCatalyst
+
+PATIENTS = 100000
+PER_PAGE = 100
+REPEAT = 30
+
+
+def run():
+    catalyst = FakeCatalyst().install()
+    catalyst.db.insert('Patient', [{'Name': f'P{i}', 'Phonenumber': str(i), 'UUID': f'u{i}'} for i in range(PATIENTS)])
+    deep_cursor = main._encode_cursor(499 * PER_PAGE)
+    cases = [
+        ('offset, page 1', {'page': 1, 'perPage': PER_PAGE}),
+        ('offset, page 500', {'page': 500, 'perPage': PER_PAGE}),
+        ('cursor, page 1', {'cursor': '', 'perPage': PER_PAGE}),
+        ('cursor, page 500', {'cursor': deep_cursor, 'perPage': PER_PAGE}),
+    ]
+    for label, query in cases:
+        catalyst.db.reset_calls()
+        catalyst.call('GET', '/all', query=query)
+        queries = len(catalyst.db.ops('zcql'))
+        mean_ms, p95_ms = time_calls(lambda: catalyst.call('GET', '/all', query=query), REPEAT)
+        report(label, mean_ms, p95_ms, f'{queries} queries')
+
+
+if __name__ == '__main__':
+    run()
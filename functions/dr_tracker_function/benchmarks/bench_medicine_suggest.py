@@ -0,0 +1,49 @@
+"""GET /medicinestock/suggest over a 20,000-medicine catalog: index build time, then per-query
+latency of the request and of the index lookup alone."""
+import random
+import time
+
+import main
+from benchmarks.common import report, time_calls
+from tests.fake_catalyst import FakeCatalyst
+
+MEDICINES = 20000
+REPEAT = 200
+STEMS = ['Paracet', 'Ibupro', 'Amoxi', 'Cetiri', 'Azithro', 'Metfor', 'Atorva', 'Omepra', 'Panto', 'Dolo',
+         'Losar', 'Amlodi', 'Cipro', 'Doxy', 'Predni', 'Monte', 'Levo', 'Rabe', 'Telmi', 'Glime']
+SUFFIXES = ['amol', 'fen', 'cillin', 'zine', 'mycin', 'min', 'statin', 'zole', 'prazole', 'tan']
+CATEGORIES = ['Analgesic', 'Antibiotic', 'Antihistamine', 'Antidiabetic', 'Antacid', 'Statin']
+MANUFACTURERS = ['Cipla', 'Sun Pharma', 'Dr Reddys', 'Lupin', 'Zydus', 'Mankind', 'Alkem']
+QUERIES = ['p', 'para', 'paracetamol 5', 'cipla', 'anti', 'zzz']
+
+
+def _medicines():
+    rng = random.Random(3)
+    return [{
+        'Name': f'{rng.choice(STEMS)}{rng.choice(SUFFIXES)} {rng.choice([50, 100, 250, 500, 650])}',
+        'Dosage': 'tablet',
+        'Category': rng.choice(CATEGORIES),
+        'ManufacturerName': rng.choice(MANUFACTURERS),
+        'Quantity': 100,
+        'UUID': f'm{i}',
+    } for i in range(MEDICINES)]
+
+
+def run():
+    catalyst = FakeCatalyst().install()
+    catalyst.db.insert('MedicineStock', _medicines())
+
+    started = time.perf_counter()
+    catalyst.call('GET', '/medicinestock/suggest', query={'q': 'para'})
+    print(f'index build {time.perf_counter() - started:.2f} s for {MEDICINES} medicines')
+
+    for q in QUERIES:
+        _, body = catalyst.call('GET', '/medicinestock/suggest', query={'q': q})
+        mean_ms, p95_ms = time_calls(lambda: catalyst.call('GET', '/medicinestock/suggest', query={'q': q}), REPEAT)
+        report(f'request {q!r}', mean_ms, p95_ms, f"{len(body['data']['suggestions'])} hits")
+        mean_ms, p95_ms = time_calls(lambda: main._medicine_suggest_index.suggest(q, main._MEDICINE_SUGGEST_DEFAULT_LIMIT), REPEAT)
+        report(f'index lookup {q!r}', mean_ms, p95_ms)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,51 @@
+"""GET /patient/search over 100,000 patients: index build time and memory, then per-query latency."""
+import random
+import time
+import tracemalloc
+
+from benchmarks.common import report, time_calls
+from tests.fake_catalyst import FakeCatalyst
+
+PATIENTS = 100000
+REPEAT = 50
+FIRST_NAMES = ['Ramesh', 'Suresh', 'Mahesh', 'Priya', 'Anita', 'Sunita', 'Rahul', 'Rohit', 'Amit', 'Sanjay',
+               'Kavita', 'Pooja', 'Vikram', 'Arjun', 'Neha', 'Deepak', 'Meena', 'Ravi', 'Lakshmi', 'Gopal']
+LAST_NAMES = ['Sharma', 'Verma', 'Patel', 'Reddy', 'Nair', 'Iyer', 'Gupta', 'Singh', 'Kumar', 'Das',
+              'Rao', 'Joshi', 'Mehta', 'Shah', 'Pillai']
+QUERIES = ['r', 'ram', 'ramesh sharma', 'rmesh', 'zubin', 'zubni khambata', 'khamb', '4821', '98765', 'sharma r']
+
+
+def _patients():
+    rng = random.Random(2)
+    rows = [{
+        'Name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+        'Phonenumber': str(rng.randint(6 * 10 ** 9, 10 ** 10 - 1)),
+        'AdharNumber': str(rng.randint(10 ** 11, 10 ** 12 - 1)),
+        'Gender': 'M',
+        'Age': 30,
+        'UUID': f'p{i}',
+    } for i in range(PATIENTS)]
+    rows[123].update(Name='Zubin Khambatta', Phonenumber='9876543210')
+    return rows
+
+
+def run():
+    catalyst = FakeCatalyst().install()
+    catalyst.db.insert('Patient', _patients())
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    catalyst.call('GET', '/patient/search', query={'q': 'ramesh'})
+    build_seconds = time.perf_counter() - started
+    index_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f'index build {build_seconds:.2f} s, {index_bytes / 1e6:.1f} MB')
+
+    for q in QUERIES:
+        _, body = catalyst.call('GET', '/patient/search', query={'q': q})
+        mean_ms, p95_ms = time_calls(lambda: catalyst.call('GET', '/patient/search', query={'q': q}), REPEAT)
+        report(repr(q), mean_ms, p95_ms, f"{len(body['data']['patients'])} hits")
+
+
+if __name__ == '__main__':
+    run()
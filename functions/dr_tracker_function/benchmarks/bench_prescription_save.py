@@ -0,0 +1,39 @@
+"""Round trips and latency of a 10-medicine POST /prescription/save, with 5 ms per datastore call.
+
+Baseline, measured with this script on the code before PrescribedMedicine rows were bulk-inserted
+(one insert_row per medicine), and right after that change:
+
+    before bulk insert   23 round trips (12 zcql, 11 insert)   mean 128.2 ms   p95 130.8 ms
+    after bulk insert    14 round trips (12 zcql, 2 insert)    mean  79.2 ms   p95  80.5 ms
+
+Later changes to stock validation and the stock ledger brought the current figures lower still.
+"""
+from benchmarks.common import report, time_calls
+from tests.fake_catalyst import FakeCatalyst
+
+MEDICINES = 10
+LATENCY_SECONDS = 0.005
+REPEAT = 40
+
+
+def run():
+    catalyst = FakeCatalyst().install()
+    catalyst.db.insert('Patient', [{'Name': 'A', 'Phonenumber': '1', 'UUID': 'p-1'}])
+    catalyst.db.insert('MedicineStock', [{'Name': f'M{i}', 'Quantity': 10 ** 9, 'UUID': f'm{i}'} for i in range(MEDICINES)])
+    body = {
+        'PatientUUID': 'p-1',
+        'medicines': [{'MedicineName': f'M{i}', 'frequency': 'Twice daily', 'Duration': '5'} for i in range(MEDICINES)],
+    }
+    catalyst.db.latency = LATENCY_SECONDS
+
+    catalyst.db.reset_calls()
+    status, _ = catalyst.call('POST', '/prescription/save', body)
+    assert status == 200
+    calls = {kind: len(catalyst.db.ops(kind)) for kind in ('zcql', 'insert', 'update', 'delete')}
+
+    mean_ms, p95_ms = time_calls(lambda: catalyst.call('POST', '/prescription/save', body), REPEAT)
+    report(f'save, {MEDICINES} medicines', mean_ms, p95_ms, f'{sum(calls.values())} round trips {calls}')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,59 @@
+"""Cold vs warm GET /medicinestock: a cold invocation initializes a new Catalyst app and pays a
+30 ms session handshake on its first query; a warm one reuses the cached app."""
+import time
+
+import main
+from benchmarks.common import report, time_calls
+from tests.fake_catalyst import FakeApp, FakeCatalyst, FakeZcql
+
+HANDSHAKE_SECONDS = 0.03
+INITIALIZE_SECONDS = 0.002
+REPEAT = 30
+HEADERS = {'X-ZC-User-Cred-Token': 'tok', 'X-ZC-ProjectId': '1'}
+
+
+class HandshakeZcql(FakeZcql):
+    def __init__(self, db):
+        super().__init__(db)
+        self._connected = False
+
+    def execute_query(self, query):
+        if not self._connected:
+            time.sleep(HANDSHAKE_SECONDS)
+            self._connected = True
+        return super().execute_query(query)
+
+
+class HandshakeApp(FakeApp):
+    def __init__(self, db):
+        super().__init__(db)
+        self._zcql = HandshakeZcql(db)
+
+
+def run():
+    catalyst = FakeCatalyst().install()
+    catalyst.db.insert('MedicineStock', [{'Name': 'X', 'Quantity': 1, 'UUID': 'm-1'}])
+    initializations = []
+
+    def initialize(*args, **kwargs):
+        initializations.append(1)
+        time.sleep(INITIALIZE_SECONDS)
+        return HandshakeApp(catalyst.db)
+
+    main.zcatalyst_sdk.initialize = initialize
+
+    def cold():
+        main._app_cache.clear()
+        catalyst.call('GET', '/medicinestock', query={'Name': 'X'}, headers=HEADERS)
+
+    def warm():
+        catalyst.call('GET', '/medicinestock', query={'Name': 'X'}, headers=HEADERS)
+
+    for label, fn in (('cold invocation', cold), ('warm invocation', warm)):
+        del initializations[:]
+        mean_ms, p95_ms = time_calls(fn, REPEAT)
+        report(label, mean_ms, p95_ms, f'{len(initializations)} initializations')
+
+
+if __name__ == '__main__':
+    run()
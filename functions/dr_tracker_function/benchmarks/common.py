@@ -0,0 +1,19 @@
+"""Helpers shared by the benchmark scripts. Run a benchmark from functions/dr_tracker_function with
+``python -m benchmarks.<name>``; each one seeds a tests.fake_catalyst database and prints its numbers."""
+import statistics
+import time
+
+
+def time_calls(fn, repeat):
+    """Call ``fn`` ``repeat`` times; return (mean, p95) wall time in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[max(0, int(len(samples) * 0.95) - 1)]
+
+
+def report(label, mean_ms, p95_ms, extra=''):
+    print(f'{label:<40} mean {mean_ms:8.2f} ms   p95 {p95_ms:8.2f} ms   {extra}'.rstrip())
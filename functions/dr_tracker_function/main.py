@@ -1,13 +1,532 @@
+import base64
+import bisect
+import csv
+import datetime
+import hashlib
+import heapq
+import io
+import itertools
+import json
 import logging
-from flask import Request, make_response, jsonify
+import math
+import os
+import re
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from flask import Request, Response, make_response
 import zcatalyst_sdk
 import uuid
+import zlib
+
+try:
+    import orjson
+except ImportError:  # optional; responses are encoded with the json module instead
+    orjson = None
  
 logger = logging.getLogger()
 
-def _create_patient(request: Request, app):
-    req_data = request.get_json(silent=True) or {}
-    logger.info(f"[main.py] Received add patient request: {req_data}")
+# ZCQL returns at most this many rows per SELECT
+_ZCQL_MAX_ROWS = 300
+
+# Max values sent in a single ZCQL IN (...) list
+_ZCQL_IN_CHUNK_SIZE = 100
+
+# Max rows per datastore bulk insert_rows/delete_rows call
+_DATASTORE_BATCH_SIZE = 200
+
+# Stock ledger: MedicineStock.Quantity is a snapshot as of MedicineStock.LedgerRowId, and
+# StockMovement rows appended after it carry every later change. MedicineStock.OpeningQuantity
+# keeps the quantity the medicine was added with, so the ledger can be replayed from it after
+# compaction. A medicine's snapshot is compacted once this many movements are pending on it.
+_LEDGER_COMPACT_THRESHOLD = 50
+# Max distinct LedgerRowId watermarks ORed into one StockMovement scan
+_LEDGER_SCAN_MAX_WATERMARKS = 25
+_stock_ledger_stats = {'overdrafts': 0, 'compactions': 0, 'compactionConflicts': 0}
+_stock_ledger_stats_lock = threading.Lock()
+
+# Per-request datastore instrumentation. Set DRTRACKER_QUERY_TRACE=true to log every call
+# (with its ZCQL text) in the request log line, not just the totals.
+_QUERY_TRACE_DEBUG = os.environ.get('DRTRACKER_QUERY_TRACE', '').lower() in ('1', 'true', 'yes')
+_TRACED_TABLE_METHODS = frozenset((
+    'get_row', 'insert_row', 'insert_rows', 'update_row', 'update_rows', 'delete_row', 'delete_rows'
+))
+_ZCQL_TABLE_PATTERN = re.compile(r'\b(?:FROM|UPDATE|INTO)\s+(\w+)', re.IGNORECASE)
+
+# Worker threads used to send bulk deletes of a patient cascade concurrently
+_CASCADE_DELETE_WORKERS = 4
+
+# Catalyst apps reused across warm invocations, keyed by a digest of the request's
+# credential headers. Each app keeps its service clients, and with them their HTTP
+# sessions, so pooled keep-alive connections survive between invocations.
+_APP_CACHE_MAX_ENTRIES = 32
+_APP_CACHE_TTL_SECONDS = 300
+_CREDENTIAL_HEADERS = (
+    'X-ZC-ProjectId', 'X-ZC-Project-Domain', 'X-ZC-Project-Key', 'X-ZC-Environment',
+    'X-ZC-Admin-Cred-Type', 'X-ZC-Admin-Cred-Token', 'X-ZC-User-Cred-Type',
+    'X-ZC-User-Cred-Token', 'x-zc-cookie', 'X-ZC-User-Type'
+)
+_app_cache = OrderedDict()  # {credentials_key: (app, created_at)}
+_app_cache_lock = threading.Lock()
+
+# In-process MedicineStock catalog: {requested name: (row, cached_at)}. Rows are stored without
+# their volatile columns, so Quantity and LedgerRowId are always re-read from the datastore.
+_STOCK_CATALOG_TTL_SECONDS = 120
+_STOCK_CATALOG_MAX_ENTRIES = 2048
+_STOCK_CATALOG_VOLATILE_COLUMNS = ('Quantity', 'LedgerRowId', 'MODIFIEDTIME')
+_stock_catalog = OrderedDict()
+_stock_catalog_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+_stock_catalog_lock = threading.Lock()
+
+# Prefix index behind /medicinestock/suggest, rebuilt from a full scan once it is this old
+_MEDICINE_SUGGEST_TTL_SECONDS = 600
+_MEDICINE_SUGGEST_DEFAULT_LIMIT = 10
+_MEDICINE_SUGGEST_MAX_LIMIT = 50
+
+# Trigram index behind /patient/search, rebuilt from a full scan once it is this old. Name
+# matches that are not word prefixes need at least this share of the query's trigrams, and
+# only the best-covered (then newest) candidates are ranked. The index costs about 1.1 KB per
+# patient, so above the row cap searches go to ZCQL instead of holding it in the instance.
+_PATIENT_SEARCH_TTL_SECONDS = 600
+_PATIENT_SEARCH_MAX_INDEXED_ROWS = 150000
+_PATIENT_SEARCH_DEFAULT_LIMIT = 20
+_PATIENT_SEARCH_MAX_LIMIT = 100
+_PATIENT_SEARCH_MIN_SIMILARITY = 0.5
+_PATIENT_SEARCH_MAX_CANDIDATES = 500
+
+# zlib level for gzip-encoded /export streams
+_EXPORT_GZIP_LEVEL = 6
+
+# Buffered responses are gzip/deflate-encoded from this size on, when the client accepts it
+_COMPRESS_MIN_BYTES = 1024
+_COMPRESS_LEVEL = 6
+
+# Max UUIDs accepted by the batch-get endpoints
+_BATCH_GET_MAX_UUIDS = 1000
+
+# Rows per /sync page (also the cap on tombstones and ledger movements read per page)
+_SYNC_DEFAULT_PAGE_SIZE = 200
+
+# /insights/patients results per ``days`` window: {days: (insights, computed_at)}
+_INSIGHTS_CACHE_TTL_SECONDS = 60
+_INSIGHTS_DEFAULT_DAYS = 30
+_INSIGHTS_MAX_DAYS = 365
+_INSIGHTS_TOP_PROFESSIONS = 20
+_insights_cache = {}
+_insights_cache_lock = threading.Lock()
+
+# Per-table row counts for the list endpoints: {table_name: (count, fetched_at)}
+_COUNT_CACHE_TTL_SECONDS = 60
+_count_cache = {}
+_count_cache_lock = threading.Lock()
+
+
+def _finite_json(value):
+    """``value`` with NaN and infinite floats replaced by None, the way orjson encodes them."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: _finite_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite_json(v) for v in value]
+    return value
+
+
+def _encode_json_stdlib(payload):
+    options = dict(separators=(',', ':'), sort_keys=True, ensure_ascii=False, allow_nan=False, default=str)
+    try:
+        text = json.dumps(payload, **options)
+    except ValueError:
+        # NaN and Infinity are not JSON (a Weight of "nan" parses as one); send them as null
+        text = json.dumps(_finite_json(payload), **options)
+    return (text + '\n').encode('utf-8')
+
+
+def _encode_json_orjson(payload):
+    # Datetimes go through default=str, as with the json module, instead of orjson's RFC 3339 form
+    return orjson.dumps(payload, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+                        | orjson.OPT_APPEND_NEWLINE | orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+# Response body encoder: orjson when it is installed, else the json module. Both emit compact,
+# key-sorted UTF-8 JSON with datetimes as str() and NaN/Infinity as null, but floats in exponent
+# form still differ (1e+16 vs 1e16). Body-hash ETags are therefore only stable within a deployment,
+# which always uses one encoder.
+_encode_json = _encode_json_orjson if orjson is not None else _encode_json_stdlib
+
+
+def jsonify(payload):
+    """JSON response for ``payload``, encoded with _encode_json. Non-JSON values such as
+    datetimes are rendered with str()."""
+    return Response(_encode_json(payload), mimetype='application/json')
+
+
+def _negotiate_encoding(request: Request, response):
+    """The encoding _compress_response gives this response: 'gzip', 'deflate' or None. Buffered
+    bodies of at least _COMPRESS_MIN_BYTES get Vary: Accept-Encoding, whichever is chosen."""
+    if response.is_streamed or response.status_code in (204, 304) or 'Content-Encoding' in response.headers:
+        return None
+    if len(response.get_data()) < _COMPRESS_MIN_BYTES:
+        return None
+    response.vary.add('Accept-Encoding')
+    return request.accept_encodings.best_match(('gzip', 'deflate'))
+
+
+def _compress_response(request: Request, response):
+    """Gzip or deflate a buffered response body of at least _COMPRESS_MIN_BYTES, as negotiated
+    from Accept-Encoding. Streamed responses (the exports) compress themselves and are skipped.
+
+    A compressed body is a different representation, so a strong ETag is downgraded to a weak
+    one; If-None-Match is compared weakly, so the client's next conditional GET still matches.
+    """
+    encoding = _negotiate_encoding(request, response)
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(_COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    else:
+        compressor = zlib.compressobj(_COMPRESS_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS)
+    response.set_data(compressor.compress(body) + compressor.flush())
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def _encode_cursor(rowid):
+    """Encode the last ROWID of a page into an opaque, URL-safe pagination cursor."""
+    raw = f"r:{rowid}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor):
+    """Decode a pagination cursor into the ROWID it points past. Raises ValueError if malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+    except Exception:
+        raise ValueError(f'Invalid cursor: {cursor}')
+    prefix, _, rowid = raw.partition(':')
+    if prefix != 'r' or not rowid.isdigit():
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return int(rowid)
+
+
+def _parse_paging_args(request: Request):
+    """Read page/perPage/cursor query params for list endpoints.
+
+    Returns (page, per_page, after_rowid). after_rowid is None in page mode; in cursor
+    mode (a ``cursor`` param is present, empty for the first page) it is the ROWID the
+    next page starts after. Raises ValueError for a malformed cursor.
+    """
+    page = request.args.get('page')
+    per_page = request.args.get('perPage')
+    cursor = request.args.get('cursor')
+    try:
+        page = int(page) if page is not None else 1
+    except Exception:
+        page = 1
+    try:
+        per_page = int(per_page) if per_page is not None else 50
+    except Exception:
+        per_page = 50
+
+    if cursor is None:
+        return page, per_page, None
+    # One extra row is fetched per keyset page to detect hasMore
+    per_page = max(1, min(per_page, _ZCQL_MAX_ROWS - 1))
+    after_rowid = _decode_cursor(cursor) if cursor else 0
+    return page, per_page, after_rowid
+
+
+def _paged_select(select_clause, page, per_page, after_rowid=None):
+    """Append the paging clause to a list endpoint's SELECT.
+
+    Cursor mode seeks past ``after_rowid`` on ROWID, so every page costs the same no matter
+    how deep it is and concurrent inserts never shift rows between pages. Page mode keeps
+    the legacy ``LIMIT offset,per_page`` form.
+    """
+    if after_rowid is not None:
+        return f"{select_clause} WHERE ROWID > {int(after_rowid)} ORDER BY ROWID ASC LIMIT 0,{per_page + 1}"
+    offset = (page - 1) * per_page
+    return f"{select_clause} LIMIT {offset},{per_page}"
+
+
+def _keyset_page(rows, per_page, rowid_key):
+    """Trim a cursor-mode result to per_page rows. Returns (rows, has_more, next_cursor)."""
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    next_cursor = _encode_cursor(rows[-1][rowid_key]) if has_more and rows else None
+    return rows, has_more, next_cursor
+
+
+def _row_etag(table_name, rows, *extra):
+    """ETag value for rows of ``table_name``, derived from their ROWID and MODIFIEDTIME
+    (plus ``extra`` values that are part of the body but not of the row, such as a stock
+    balance). Any write to a row changes its MODIFIEDTIME and with it the tag."""
+    digest = hashlib.sha1(table_name.encode('utf-8'))
+    for row in rows:
+        if row:
+            digest.update(f"|{row.get('ROWID')}:{row.get('MODIFIEDTIME')}".encode('utf-8'))
+    for value in extra:
+        digest.update(f"|{value}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _set_row_etag(response, etag):
+    """Tag a response with a _row_etag value. The tag names the rows, not the encoded bytes, so
+    it is sent weak and with Vary: Accept-Encoding whether or not the body gets compressed;
+    a 304 for it then carries exactly the headers of the 200 it stands for."""
+    response.set_etag(etag, weak=True)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def _not_modified(etag):
+    """Bodyless 304 for a request whose If-None-Match matched the _row_etag value ``etag``."""
+    return _set_row_etag(make_response('', 304), etag)
+
+
+def _check_row_validator(request: Request, app, table_name, key_column, key):
+    """Answer a conditional single-row GET from the row's validator alone.
+
+    When the request carries If-None-Match, only ROWID and MODIFIEDTIME of the row are read;
+    if the resulting ETag matches, the 304 is returned without fetching or serializing the
+    full row. Returns None when the caller should serve the full response.
+    """
+    if not request.if_none_match:
+        return None
+    row = app.loader(table_name, key_column, f'ROWID, {key_column}, MODIFIEDTIME').load(key)
+    etag = _row_etag(table_name, [row])
+    return _not_modified(etag) if request.if_none_match.contains_weak(etag) else None
+
+
+def _make_conditional(request: Request, response):
+    """Tag a buffered GET 200 response that has no ETag yet with a hash of its body, and turn
+    it into a 304 when it matches the request's If-None-Match. Streamed bodies are left alone.
+
+    The encoding is negotiated first, so a 304 carries the same Vary and (weak, if the 200
+    would be compressed) ETag as the 200 it stands for.
+    """
+    if request.method != 'GET' or response.status_code != 200 or response.is_streamed:
+        return response
+    if 'ETag' not in response.headers:
+        response.add_etag()
+    if _negotiate_encoding(request, response) is not None:
+        response.set_etag(response.get_etag()[0], weak=True)
+    response = response.make_conditional(request)
+    if response.status_code == 304:
+        response.set_data(b'')
+    return response
+
+
+class _Fieldset:
+    """Allowlist behind a list endpoint's ``fields=`` parameter, compiled at import.
+
+    Maps each response field to the columns it is read from, so a sparse request narrows
+    both the ZCQL SELECT and the serialized items. The key field is always returned.
+    """
+
+    __slots__ = ('key_field', 'field_columns', 'all_columns')
+
+    def __init__(self, key_field, field_columns):
+        self.key_field = key_field
+        self.field_columns = {field: tuple(c.strip() for c in columns.split(',')) for field, columns in field_columns}
+        self.all_columns = self.select_columns(None)
+
+    def parse(self, request: Request):
+        """The requested fields, or None for all of them. Raises ValueError for unknown fields."""
+        raw = request.args.get('fields')
+        if raw is None or not raw.strip():
+            return None
+        requested = [field.strip() for field in raw.split(',') if field.strip()]
+        unknown = [field for field in requested if field not in self.field_columns]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(self.field_columns)}")
+        return tuple(dict.fromkeys([self.key_field] + requested))
+
+    def select_columns(self, fields, *extra_columns):
+        """ZCQL column list for ``fields`` (None for all), always including ROWID."""
+        columns = dict.fromkeys(('ROWID',) + extra_columns)
+        for field in self.field_columns if fields is None else fields:
+            columns.update(dict.fromkeys(self.field_columns[field]))
+        return ', '.join(columns)
+
+    @staticmethod
+    def shape(item, fields):
+        return item if fields is None else {field: item[field] for field in fields}
+
+
+def _chunked(values, size):
+    """Yield successive lists of at most ``size`` items from ``values``."""
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _zcql_in_list(values):
+    """Render values as a quoted, escaped ZCQL IN (...) list body."""
+    return ', '.join("'" + str(v).replace("'", "\\'") + "'" for v in values)
+
+
+def _unwrap_row(item, table_name):
+    """Strip the {'<Table>': {...}} envelope ZCQL puts around each result row."""
+    if isinstance(item, dict) and len(item) == 1 and list(item.keys())[0] == table_name:
+        return list(item.values())[0]
+    return item
+
+
+def _zcql_scan(zcql, table_name, columns='*', where=None, after_rowid=0, page_size=_ZCQL_MAX_ROWS):
+    """Stream every row matched by a ZCQL SELECT, however many pages it spans.
+
+    ZCQL caps each result, so pages are requested as ``ROWID > <last> ORDER BY ROWID`` until
+    a short page comes back. While the caller consumes one page the next is already being
+    fetched on a background thread. Rows are yielded unwrapped, in ROWID order.
+
+    Args:
+        zcql: ZCQL service instance
+        table_name: Table to select from
+        columns: Column list for the SELECT; must include ROWID
+        where: Optional condition (ANDed with the ROWID bound, so avoid top-level OR)
+        after_rowid: Only rows with a ROWID above this are returned
+        page_size: Rows per page, at most _ZCQL_MAX_ROWS
+    """
+    def fetch(last_rowid):
+        condition = f"{where} AND ROWID > {last_rowid}" if where else f"ROWID > {last_rowid}"
+        return zcql.execute_query(
+            f"SELECT {columns} FROM {table_name} WHERE {condition} ORDER BY ROWID ASC LIMIT 0,{page_size}"
+        ) or []
+
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        page = fetch(int(after_rowid or 0))
+        while page:
+            rows = [_unwrap_row(item, table_name) for item in page]
+            if len(page) < page_size:
+                yield from rows
+                return
+            next_page = prefetcher.submit(fetch, int(rows[-1].get('ROWID')))
+            yield from rows
+            page = next_page.result()
+
+
+class _RowLoader:
+    """Request-scoped batch loader for rows of one table looked up by one key column.
+
+    Keys asked for are deduped and fetched with chunked ``IN (...)`` queries. Results,
+    misses included, are kept for the rest of the request, so repeated lookups of the same
+    key cost nothing. Obtain loaders through ``app.loader(...)`` so they are shared by
+    everything that handles the request.
+    """
+
+    def __init__(self, zcql, table_name, key_column, columns='*'):
+        self._zcql = zcql
+        self._table_name = table_name
+        self._key_column = key_column
+        self._columns = columns  # must include ROWID and key_column
+        self._rows = {}  # {key: [row, ...]}, an empty list for keys known to be missing
+
+    def load_many(self, keys):
+        """Return {key: [rows]} for the given keys that have at least one row, in ROWID order."""
+        keys = [str(key) for key in keys if key is not None and str(key) != '']
+        missing = [key for key in dict.fromkeys(keys) if key not in self._rows]
+        for chunk in _chunked(missing, _ZCQL_IN_CHUNK_SIZE):
+            fetched = {}
+            folded = {}
+            where = f"{self._key_column} IN ({_zcql_in_list(chunk)})"
+            for row in _zcql_scan(self._zcql, self._table_name, self._columns, where):
+                fetched.setdefault(str(row.get(self._key_column)), []).append(row)
+                folded.setdefault(str(row.get(self._key_column)).casefold(), []).append(row)
+            for key in chunk:
+                # ZCQL may compare strings case-insensitively; fall back to such a match
+                self._rows[key] = fetched.get(key) or folded.get(key.casefold(), [])
+        return {key: self._rows[key] for key in keys if self._rows[key]}
+
+    def load_rows(self, key):
+        """All rows whose key column equals ``key`` (empty list if none)."""
+        return self.load_many([key]).get(str(key), [])
+
+    def load(self, key):
+        """The first row whose key column equals ``key``, or None."""
+        rows = self.load_rows(key)
+        return rows[0] if rows else None
+
+    def prime(self, key, row):
+        """Record a row this request has just written so later lookups need no query."""
+        key = str(key)
+        rows = [r for r in self._rows.get(key, []) if r.get('ROWID') != row.get('ROWID')]
+        self._rows[key] = rows + [row]
+
+    def clear(self, key=None):
+        """Forget one key, or everything when ``key`` is None."""
+        if key is None:
+            self._rows.clear()
+        else:
+            self._rows.pop(str(key), None)
+
+
+def _parse_count_result(row_count):
+    """Extract the integer from a ``SELECT COUNT(ROWID)`` result, whichever envelope it comes in."""
+    total = 0
+    if row_count:
+        first = row_count[0]
+        if isinstance(first, dict):
+            for v in first.values():
+                if isinstance(v, dict):
+                    for vv in v.values():
+                        try:
+                            total = int(vv)
+                            break
+                        except Exception:
+                            continue
+            if total == 0:
+                for k, vv in first.items():
+                    try:
+                        total = int(vv)
+                        break
+                    except Exception:
+                        continue
+    return total
+
+
+def _get_table_count(zcql, table_name, exact=False):
+    """Return the row count of a table, served from the count cache while it is fresh.
+
+    ``exact=True`` always runs ``SELECT COUNT(ROWID)`` and refreshes the cached value.
+    """
+    now = time.monotonic()
+    if not exact:
+        with _count_cache_lock:
+            cached = _count_cache.get(table_name)
+        if cached and now - cached[1] < _COUNT_CACHE_TTL_SECONDS:
+            return cached[0]
+    total = _parse_count_result(zcql.execute_query(f"SELECT COUNT(ROWID) FROM {table_name}"))
+    with _count_cache_lock:
+        _count_cache[table_name] = (total, now)
+    return total
+
+
+def _adjust_table_count(table_name, delta):
+    """Apply a known insert/delete delta to a cached count without resetting its TTL."""
+    if not delta:
+        return
+    with _count_cache_lock:
+        cached = _count_cache.get(table_name)
+        if cached:
+            _count_cache[table_name] = (max(0, cached[0] + delta), cached[1])
+
+
+def _wants_exact_count(request: Request):
+    return str(request.args.get('exactCount', '')).lower() == 'true'
+
+
+def _build_patient_data(req_data):
+    """Validate and convert a patient payload with the rules of POST /add.
+
+    Returns (patient_data, error). patient_data has no UUID yet; error is None when valid.
+    """
     name = req_data.get("Name")
     gender = req_data.get("Gender")
     age = req_data.get("Age")
@@ -21,13 +540,13 @@ def _create_patient(request: Request, app):
     # current_symptoms field removed from Patient schema
 
     if not name:
-        return make_response(jsonify({'status': 'failure', 'error': 'Missing required field: Name'}), 400)
+        return None, 'Missing required field: Name'
     if not phone:
-        return make_response(jsonify({'status': 'failure', 'error': 'Missing required field: Phonenumber'}), 400)
+        return None, 'Missing required field: Phonenumber'
     if not gender:
-        return make_response(jsonify({'status': 'failure', 'error': 'Missing required field: Gender'}), 400)
+        return None, 'Missing required field: Gender'
     if not age:
-        return make_response(jsonify({'status': 'failure', 'error': 'Missing required field: Age'}), 400)
+        return None, 'Missing required field: Age'
 
     try:
         age = int(age) if age is not None and str(age) != '' else None
@@ -42,18 +561,6 @@ def _create_patient(request: Request, app):
     except Exception:
         height = None
 
-    try:
-        zcql = app.zcql()
-        safe_phone = str(phone).replace("'", "\\'")
-        existing = zcql.execute_query(f"SELECT * FROM Patient WHERE Phonenumber = '{safe_phone}'")
-        if existing and len(existing) > 0:
-            return make_response(jsonify({'status': 'failure', 'error': 'Phonenumber already exists'}), 409)
-    except Exception:
-        logger.exception('Failed to check Phonenumber uniqueness')
-
-    table = app.datastore().table('Patient')
-    logger.info(f"[main.py] Inserting patient row: Name={name}, Gender={gender}, Age={age}, Profession={profession}, Weight={weight}, Height={height}, Phonenumber={phone}, MedicialHistory={medical_history}")
-    patient_uuid = generate_uuid()
     patient_data = {
         'Name': name,
         'Gender': gender,
@@ -63,7 +570,6 @@ def _create_patient(request: Request, app):
         'Height': height,
         'Phonenumber': phone,
         'MedicialHistory': medical_history,
-        'UUID': patient_uuid,
         'Address': address
     }
     # Only add AdharNumber if it is a valid integer
@@ -72,24 +578,49 @@ def _create_patient(request: Request, app):
             patient_data['AdharNumber'] = int(adhar_number)
     except Exception:
         pass
+    return patient_data, None
+
+
+def _create_patient(request: Request, app):
+    req_data = request.get_json(silent=True) or {}
+    logger.info(f"[main.py] Received add patient request: {req_data}")
+    patient_data, error = _build_patient_data(req_data)
+    if error:
+        return make_response(jsonify({'status': 'failure', 'error': error}), 400)
+    phone = patient_data['Phonenumber']
+    adhar_number = req_data.get("AdharNumber")
+
+    try:
+        if app.loader('Patient', 'Phonenumber').load(phone) is not None:
+            return make_response(jsonify({'status': 'failure', 'error': 'Phonenumber already exists'}), 409)
+    except Exception:
+        logger.exception('Failed to check Phonenumber uniqueness')
+
+    table = app.datastore().table('Patient')
+    logger.info(f"[main.py] Inserting patient row: {patient_data}")
+    patient_uuid = generate_uuid()
+    patient_data['UUID'] = patient_uuid
     row = table.insert_row(patient_data)
+    if isinstance(row, dict):
+        _update_patient_search_index(upsert=row)
+    _adjust_table_count('Patient', 1)
 
     row_id = None
     if isinstance(row, dict):
         row_id = row.get('ROWID') or row.get('id') or row.get('Id') or row.get('ROW_ID')
     patient = {
         'patientId': row_id or phone, 
-        'Name': name, 
+        'Name': patient_data['Name'], 
         'UUID': patient_uuid,
-        'Gender': gender,
-        'Age': age,
-        'Profession': profession,
-        'Weight': weight,
-        'Height': height,
+        'Gender': patient_data['Gender'],
+        'Age': patient_data['Age'],
+        'Profession': patient_data['Profession'],
+        'Weight': patient_data['Weight'],
+        'Height': patient_data['Height'],
         'Phonenumber': phone,
-        'MedicialHistory': medical_history,
+        'MedicialHistory': patient_data['MedicialHistory'],
         'AdharNumber': adhar_number if adhar_number else None,
-        'Address': address
+        'Address': patient_data['Address']
     }
     response_data = {
         'status': 'success',
@@ -101,68 +632,315 @@ def _create_patient(request: Request, app):
     return make_response(jsonify(response_data), 200)
 
 
-def _list_patients(request: Request, app):
-    page = request.args.get('page')
-    per_page = request.args.get('perPage')
+def _iter_import_records(request: Request, import_format):
+    """Yield (line, record or None) from a streamed CSV or NDJSON request body; None marks a bad line."""
+    body = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+    if import_format == 'csv':
+        reader = csv.DictReader(body)
+        for record in reader:
+            # Empty cells count as absent, like omitted JSON keys
+            yield reader.line_num, {k: (v if v != '' else None) for k, v in record.items() if k}
+        return
+    for line_no, line in enumerate(body, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_no, None
+            continue
+        yield line_no, record if isinstance(record, dict) else None
+
+
+def _insert_patient_batch(app, batch, results):
+    """Insert validated (line, patient_data) pairs in one bulk call, one row at a time if it fails.
+
+    The bulk call may have been committed before it failed, so before retrying, the batch's
+    Phonenumbers are looked up again: rows already written (matched by their UUID) count as
+    created, and a Phonenumber taken by another row in the meantime fails its line.
+    """
+    table = app.datastore().table('Patient')
     try:
-        page = int(page) if page is not None else 1
+        inserted = table.insert_rows([patient_data for _, patient_data in batch])
+        if not isinstance(inserted, list) or len(inserted) != len(batch):
+            raise ValueError('Bulk insert returned an unexpected result')
+        outcomes = list(zip(batch, inserted))
     except Exception:
-        page = 1
+        logger.exception('Bulk patient insert failed, inserting %s rows one at a time', len(batch))
+        try:
+            written = _RowLoader(app.zcql(), 'Patient', 'Phonenumber', _PATIENT_LIST_COLUMNS).load_many(
+                [patient_data['Phonenumber'] for _, patient_data in batch])
+        except Exception as e:
+            # Without the lookup a retry could duplicate committed rows, so fail the batch instead
+            logger.exception('Failed to check which of %s patients were written', len(batch))
+            for line_no, _ in batch:
+                results.append({'line': line_no, 'status': 'failed', 'error': f'Failed to insert patient: {e}'})
+            return 0
+        outcomes = []
+        for line_no, patient_data in batch:
+            existing = written.get(str(patient_data['Phonenumber']))
+            if existing:
+                row = next((r for r in existing if r.get('UUID') == patient_data['UUID']), None)
+                if row is not None:
+                    outcomes.append(((line_no, patient_data), row))
+                else:
+                    results.append({'line': line_no, 'status': 'failed', 'error': 'Phonenumber already exists'})
+                continue
+            try:
+                outcomes.append(((line_no, patient_data), table.insert_row(patient_data)))
+            except Exception as e:
+                results.append({'line': line_no, 'status': 'failed', 'error': f'Failed to insert patient: {e}'})
+
+    for (line_no, patient_data), row in outcomes:
+        row_id = row.get('ROWID') if isinstance(row, dict) else None
+        results.append({'line': line_no, 'status': 'created', 'UUID': patient_data['UUID'], 'ROWID': row_id})
+        if isinstance(row, dict):
+            _update_patient_search_index(upsert=row)
+    _adjust_table_count('Patient', len(outcomes))
+    return len(outcomes)
+
+
+def _import_patients(request: Request, app):
+    """Bulk-create patients from a streamed CSV or NDJSON body (POST /patient/import).
+
+    Rows are validated like POST /add. Phonenumbers must be new to both the datastore and the
+    file: they are checked with batched IN lookups, one batch of rows at a time, and inserted
+    with bulk inserts. The response reports the outcome of every row by line number.
+    """
+    import_format = (request.args.get('format') or '').lower()
+    if not import_format:
+        import_format = 'csv' if request.mimetype == 'text/csv' else 'ndjson'
+    if import_format not in ('csv', 'ndjson'):
+        return make_response(jsonify({'status': 'failure', 'error': 'format must be csv or ndjson'}), 400)
+
+    results = []
+    created = 0
+    seen_phones = set()
+    phone_loader = _RowLoader(app.zcql(), 'Patient', 'Phonenumber', 'ROWID, Phonenumber')
+
+    def flush(pending):
+        existing = phone_loader.load_many([patient_data['Phonenumber'] for _, patient_data in pending])
+        phone_loader.clear()
+        batch = []
+        for line_no, patient_data in pending:
+            if str(patient_data['Phonenumber']) in existing:
+                results.append({'line': line_no, 'status': 'failed', 'error': 'Phonenumber already exists'})
+            else:
+                patient_data['UUID'] = generate_uuid()
+                batch.append((line_no, patient_data))
+        return _insert_patient_batch(app, batch, results) if batch else 0
+
     try:
-        per_page = int(per_page) if per_page is not None else 50
+        pending = []
+        for line_no, record in _iter_import_records(request, import_format):
+            if record is None:
+                results.append({'line': line_no, 'status': 'failed', 'error': 'Invalid record'})
+                continue
+            patient_data, error = _build_patient_data(record)
+            if error:
+                results.append({'line': line_no, 'status': 'failed', 'error': error})
+                continue
+            phone = str(patient_data['Phonenumber'])
+            if phone in seen_phones:
+                results.append({'line': line_no, 'status': 'failed', 'error': 'Duplicate Phonenumber in file'})
+                continue
+            seen_phones.add(phone)
+            pending.append((line_no, patient_data))
+            if len(pending) >= _DATASTORE_BATCH_SIZE:
+                created += flush(pending)
+                pending = []
+        if pending:
+            created += flush(pending)
     except Exception:
-        per_page = 50
+        logger.exception('Patient import aborted')
+        return make_response(jsonify({
+            'status': 'failure',
+            'error': 'Patient import aborted',
+            'data': {'created': created, 'results': results}
+        }), 500)
+
+    results.sort(key=lambda result: result['line'])
+    return make_response(jsonify({'status': 'success', 'data': {
+        'created': created,
+        'failed': len(results) - created,
+        'results': results
+    }}), 200)
+
+
+_PATIENT_LIST_COLUMNS = 'ROWID, Name, Gender, Age, Profession, Weight, Height, Phonenumber, MedicialHistory, UUID, AdharNumber, Address'
+
+
+def _patient_list_item(row):
+    """Shape a Patient row the way the patient list endpoints return it."""
+    return {
+        'id': row.get('ROWID') or row.get('id') or row.get('Id'),
+        'Name': row.get('Name'),
+        'Gender': row.get('Gender'),
+        'Age': row.get('Age'),
+        'Profession': row.get('Profession'),
+        'Weight': row.get('Weight'),
+        'Height': row.get('Height'),
+        'Phonenumber': row.get('Phonenumber'),
+        'MedicialHistory': row.get('MedicialHistory'),
+        'UUID': row.get('UUID'),
+        'AdharNumber': row.get('AdharNumber'),
+        'Address': row.get('Address')
+    }
+
+
+_PATIENT_FIELDSET = _Fieldset('id', [('id', 'ROWID')] + [(c, c) for c in _PATIENT_LIST_COLUMNS.split(', ')[1:]])
+
+
+def _parse_batch_uuids(request: Request):
+    """Read the UUID list of a batch-get body. Returns (uuids, error)."""
+    req_data = request.get_json(silent=True) or {}
+    uuids = req_data.get('uuids', req_data.get('UUIDs'))
+    if not isinstance(uuids, list) or not all(isinstance(u, str) and u for u in uuids):
+        return None, 'uuids must be an array of UUID strings'
+    if len(uuids) > _BATCH_GET_MAX_UUIDS:
+        return None, f'At most {_BATCH_GET_MAX_UUIDS} uuids per request'
+    return list(dict.fromkeys(uuids)), None
+
+
+def _get_patients_batch(request: Request, app):
+    """Fetch many patients by UUID (POST /patient/batch); misses map to null."""
+    uuids, error = _parse_batch_uuids(request)
+    if error:
+        return make_response(jsonify({'status': 'failure', 'error': error}), 400)
+    try:
+        found = app.loader('Patient', 'UUID', _PATIENT_LIST_COLUMNS).load_many(uuids)
+        patients = {u: _patient_list_item(found[u][0]) if u in found else None for u in uuids}
+        return make_response(jsonify({'status': 'success', 'data': {'patients': patients}}), 200)
+    except Exception:
+        logger.exception('Failed to batch fetch patients')
+        return make_response(jsonify({'status': 'failure', 'error': 'Failed to fetch patients'}), 500)
+
+
+_AGE_BUCKETS = ((0, 17, '0-17'), (18, 29, '18-29'), (30, 44, '30-44'), (45, 59, '45-59'), (60, None, '60+'))
+_BMI_BUCKETS = ((18.5, 'underweight'), (25.0, 'normal'), (30.0, 'overweight'), (None, 'obese'))
+
+
+def _age_bucket(age):
+    try:
+        age = float(age)
+    except (TypeError, ValueError):
+        return 'unknown'
+    if age < 0:
+        return 'unknown'
+    for low, high, label in _AGE_BUCKETS:
+        if age >= low and (high is None or age <= high):
+            return label
+    return 'unknown'
+
+
+def _bmi_bucket(weight, height):
+    """WHO BMI class from Weight (kg) and Height (cm, or metres when 3 or less)."""
+    try:
+        weight = float(weight)
+        height = float(height)
+    except (TypeError, ValueError):
+        return 'unknown'
+    if weight <= 0 or height <= 0:
+        return 'unknown'
+    metres = height if height <= 3 else height / 100
+    bmi = weight / (metres * metres)
+    for upper, label in _BMI_BUCKETS:
+        if upper is None or bmi < upper:
+            return label
+    return 'unknown'
+
+
+def _compute_patient_insights(zcql, days):
+    """Aggregate Patient demographics in one streamed pass; no per-patient data leaves this function."""
+    first_day = (datetime.date.today() - datetime.timedelta(days=days - 1)).isoformat()
+    total = 0
+    genders = Counter()
+    ages = Counter({label: 0 for _, _, label in _AGE_BUCKETS})
+    bmis = Counter({label: 0 for _, label in _BMI_BUCKETS})
+    professions = Counter()
+    per_day = Counter()
+    for row in _zcql_scan(zcql, 'Patient', 'ROWID, Gender, Age, Weight, Height, Profession, CREATEDTIME'):
+        total += 1
+        genders[str(row.get('Gender') or '').strip().capitalize() or 'Unknown'] += 1
+        ages[_age_bucket(row.get('Age'))] += 1
+        bmis[_bmi_bucket(row.get('Weight'), row.get('Height'))] += 1
+        professions[str(row.get('Profession') or '').strip().title() or 'Unknown'] += 1
+        created_day = str(row.get('CREATEDTIME') or '')[:10]
+        if created_day >= first_day:
+            per_day[created_day] += 1
+
+    top_professions = dict(professions.most_common(_INSIGHTS_TOP_PROFESSIONS))
+    other = total - sum(top_professions.values())
+    if other:
+        top_professions['Other'] = other
+    return {
+        'totalPatients': total,
+        'gender': dict(genders),
+        'ageBuckets': dict(ages),
+        'bmi': dict(bmis),
+        'professions': top_professions,
+        'newPatientsPerDay': [{'date': day, 'count': per_day[day]} for day in sorted(per_day)],
+        'days': days
+    }
+
+
+def _get_patient_insights(request: Request, app):
+    """Demographics for the Patient Insights dashboard (GET /insights/patients?days=30)."""
+    try:
+        days = int(request.args.get('days') or _INSIGHTS_DEFAULT_DAYS)
+    except Exception:
+        days = _INSIGHTS_DEFAULT_DAYS
+    days = max(1, min(days, _INSIGHTS_MAX_DAYS))
+
+    now = time.monotonic()
+    with _insights_cache_lock:
+        cached = _insights_cache.get(days)
+    if cached and now - cached[1] < _INSIGHTS_CACHE_TTL_SECONDS:
+        return make_response(jsonify({'status': 'success', 'data': cached[0]}), 200)
+
+    try:
+        insights = _compute_patient_insights(app.zcql(), days)
+    except Exception:
+        logger.exception('Failed to compute patient insights')
+        return make_response(jsonify({'status': 'failure', 'error': 'Failed to compute patient insights'}), 500)
+    with _insights_cache_lock:
+        _insights_cache[days] = (insights, now)
+    return make_response(jsonify({'status': 'success', 'data': insights}), 200)
+
+
+def _list_patients(request: Request, app):
+    try:
+        page, per_page, after_rowid = _parse_paging_args(request)
+    except ValueError:
+        return make_response(jsonify({'status': 'failure', 'error': 'Invalid cursor'}), 400)
+    try:
+        fields = _PATIENT_FIELDSET.parse(request)
+    except ValueError as e:
+        return make_response(jsonify({'status': 'failure', 'error': str(e)}), 400)
 
     zcql_service = app.zcql()
     total = 0
     try:
-        row_count = zcql_service.execute_query(f"SELECT COUNT(ROWID) FROM Patient")
-        if row_count:
-            first = row_count[0]
-            if isinstance(first, dict):
-                for v in first.values():
-                    if isinstance(v, dict):
-                        for vv in v.values():
-                            try:
-                                total = int(vv)
-                                break
-                            except Exception:
-                                continue
-                if total == 0:
-                    for k, vv in first.items():
-                        try:
-                            total = int(vv)
-                            break
-                        except Exception:
-                            continue
+        total = _get_table_count(zcql_service, 'Patient', exact=_wants_exact_count(request))
         has_more = total > (page) * (per_page)
     except Exception:
         logger.exception('Failed to fetch total count')
         has_more = False
 
     try:
-        offset = (page - 1) * per_page
-        query_result = zcql_service.execute_query(f"SELECT ROWID, Name, Gender, Age, Profession, Weight, Height, Phonenumber, MedicialHistory, UUID, AdharNumber, Address FROM Patient LIMIT {offset},{per_page}")
-        todo_items = []
-        for item in query_result:
-            if isinstance(item, dict) and len(item) == 1 and list(item.keys())[0] == 'Patient':
-                row = list(item.values())[0]
-            else:
-                row = item
-            todo_items.append({
-                'id': row.get('ROWID') or row.get('id') or row.get('Id'),
-                'Name': row.get('Name'),
-                'Gender': row.get('Gender'),
-                'Age': row.get('Age'),
-                'Profession': row.get('Profession'),
-                'Weight': row.get('Weight'),
-                'Height': row.get('Height'),
-                'Phonenumber': row.get('Phonenumber'),
-                'MedicialHistory': row.get('MedicialHistory'),
-                'UUID': row.get('UUID'),
-                'AdharNumber': row.get('AdharNumber'),
-                'Address': row.get('Address')
-            })
+        columns = _PATIENT_FIELDSET.select_columns(fields, 'MODIFIEDTIME')
+        query_result = zcql_service.execute_query(_paged_select(f"SELECT {columns} FROM Patient", page, per_page, after_rowid))
+        rows = [_unwrap_row(item, 'Patient') for item in query_result]
+        # The page's validator is known before anything is serialized, so a 304 skips that work
+        etag = _row_etag('Patient', rows, fields, page, per_page, after_rowid, total)
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag)
+        todo_items = [_PATIENT_FIELDSET.shape(_patient_list_item(row), fields) for row in rows]
+
+        if after_rowid is not None:
+            todo_items, has_more, next_cursor = _keyset_page(todo_items, per_page, 'id')
+            resp = {'status': 'success', 'data': {'patients': todo_items, 'hasMore': has_more, 'perPage': per_page, 'total': total, 'nextCursor': next_cursor}}
+            return _set_row_etag(make_response(jsonify(resp), 200), etag)
 
         get_resp = {
             'status': 'success',
@@ -174,7 +952,7 @@ def _list_patients(request: Request, app):
                 'total': total
             }
         }
-        return make_response(jsonify(get_resp), 200)
+        return _set_row_etag(make_response(jsonify(get_resp), 200), etag)
     except Exception:
         logger.exception('Failed to query patients')
         return make_response(jsonify({'status': 'failure', 'error': 'Failed to fetch patients'}), 500)
@@ -185,49 +963,295 @@ def _get_patient_by_phone(request: Request, app):
     if not phone:
         return make_response(jsonify({'status': 'failure', 'error': 'Missing phone query parameter'}), 400)
     try:
-        zcql_service = app.zcql()
-        safe_phone = str(phone).replace("'", "\\'")
-        query_result = zcql_service.execute_query(f"SELECT * FROM Patient WHERE Phonenumber = '{safe_phone}'")
-        if query_result:
-            item = query_result[0]
-            if isinstance(item, dict) and len(item) == 1 and list(item.keys())[0] == 'Patient':
-                row = list(item.values())[0]
-            else:
-                row = item
-            resp = {'status': 'success', 'data': {'patient': row}}
-        else:
-            resp = {'status': 'success', 'data': {'patient': None}}
-        return make_response(jsonify(resp), 200)
+        not_modified = _check_row_validator(request, app, 'Patient', 'Phonenumber', phone)
+        if not_modified is not None:
+            return not_modified
+        row = app.loader('Patient', 'Phonenumber').load(phone)
+        resp = {'status': 'success', 'data': {'patient': row}}
+        return _set_row_etag(make_response(jsonify(resp), 200), _row_etag('Patient', [row]))
     except Exception:
         logger.exception('Failed to query patient by phone')
         return make_response(jsonify({'status': 'failure', 'error': 'Failed to fetch patient'}), 500)
 
 
-def _delete_prescription_cascade_internal(app, zcql, prescription_uuid):
+class _PatientSearchIndex:
+    """Trigram index over Patient Name, Phonenumber and AdharNumber.
+
+    Name words are indexed as '  word ' trigrams, so a query word padded the same way (without
+    the trailing space) matches every word it prefixes and still scores typos by shared
+    trigrams. Phone and Aadhaar numbers are indexed as digit trigrams for partial matches.
+    Postings are plain lists of ROWIDs to keep the index small at 100k+ patients.
+    Not thread-safe; the shared instance is only used under _patient_search_lock.
+    """
+
+    def __init__(self):
+        self.built_at = None
+        self._docs = {}  # {rowid: search result dict}
+        self._name_grams = {}  # {trigram: [rowid, ...]}
+        self._number_grams = {}
+        self._numbers = {}  # {rowid: (phone digits, Aadhaar digits)}
+
+    @staticmethod
+    def _word_trigrams(text, pad_end=True):
+        grams = set()
+        for word in str(text or '').casefold().split():
+            padded = '  ' + word + (' ' if pad_end else '')
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        return grams
+
+    @staticmethod
+    def _digits(value):
+        return ''.join(ch for ch in str(value or '') if ch.isdigit())
+
+    @staticmethod
+    def _digit_trigrams(digits):
+        return {digits[i:i + 3] for i in range(len(digits) - 2)}
+
+    def _doc_grams(self, doc):
+        numbers = set()
+        for field in ('Phonenumber', 'AdharNumber'):
+            numbers |= self._digit_trigrams(self._digits(doc.get(field)))
+        return self._word_trigrams(doc.get('Name')), numbers
+
+    def _doc_numbers(self, doc):
+        return tuple(self._digits(doc.get(field)) for field in ('Phonenumber', 'AdharNumber'))
+
+    @staticmethod
+    def _make_doc(row):
+        """(integer ROWID the index is keyed by, search result), or (None, None) without a ROWID.
+        The result keeps the datastore's string ROWID."""
+        rowid = _as_int(row.get('ROWID'), None)
+        if rowid is None:
+            return None, None
+        return rowid, {
+            'ROWID': str(row.get('ROWID')),
+            'UUID': row.get('UUID'),
+            'Name': row.get('Name'),
+            'Gender': row.get('Gender'),
+            'Age': row.get('Age'),
+            'Phonenumber': row.get('Phonenumber'),
+            'AdharNumber': row.get('AdharNumber')
+        }
+
+    def _add(self, rowid, doc):
+        self._docs[rowid] = doc
+        self._numbers[rowid] = self._doc_numbers(doc)
+        names, numbers = self._doc_grams(doc)
+        for postings, grams in ((self._name_grams, names), (self._number_grams, numbers)):
+            for gram in grams:
+                postings.setdefault(gram, []).append(rowid)
+
+    def build(self, rows):
+        self._docs, self._name_grams, self._number_grams, self._numbers = {}, {}, {}, {}
+        for row in rows:
+            rowid, doc = self._make_doc(row)
+            if doc is not None:
+                self._add(rowid, doc)
+        self.built_at = time.monotonic()
+
+    def upsert(self, row):
+        rowid, doc = self._make_doc(row)
+        if doc is not None:
+            self.remove(rowid)
+            self._add(rowid, doc)
+
+    def update_fields(self, rowid, fields):
+        """Apply a partial update to an indexed patient; unknown ROWIDs are left to the next rebuild."""
+        doc = self._docs.get(_as_int(rowid, None))
+        if doc is not None:
+            self.upsert(dict(doc, **{k: v for k, v in fields.items() if k in doc}))
+
+    def remove(self, rowid):
+        rowid = _as_int(rowid, None)
+        doc = self._docs.pop(rowid, None)
+        if doc is None:
+            return
+        self._numbers.pop(rowid, None)
+        names, numbers = self._doc_grams(doc)
+        for postings, grams in ((self._name_grams, names), (self._number_grams, numbers)):
+            for gram in grams:
+                rowids = postings.get(gram)
+                if rowids and rowid in rowids:
+                    rowids.remove(rowid)
+                    if not rowids:
+                        del postings[gram]
+
+    def search(self, query, limit):
+        """Ranked matches for a name (prefix or fuzzy) or a partial phone/Aadhaar number."""
+        digits = self._digits(query)
+        if len(digits) >= 3 and not any(ch.isalpha() for ch in query):
+            return self._search_number(digits, limit)
+        return self._search_name(query, limit)
+
+    def _top_name_candidates(self, grams, needed):
+        """ROWIDs sharing at least ``needed`` of ``grams``, best-covered then newest first, capped."""
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._name_grams.get(gram, ()))
+        return heapq.nlargest(_PATIENT_SEARCH_MAX_CANDIDATES,
+                              ((count, rowid) for rowid, count in shared.items() if count >= needed))
+
+    def _search_number(self, digits, limit):
+        # Walk the rarest trigram's postings, most recently indexed first, and keep real substring matches
+        postings = min((self._number_grams.get(gram, []) for gram in self._digit_trigrams(digits)), key=len)
+        ranked = []
+        for rowid in reversed(postings):
+            best = None
+            for value in self._numbers[rowid]:
+                if value == digits:
+                    rank = 0
+                elif value.startswith(digits):
+                    rank = 1
+                elif digits in value:
+                    rank = 2
+                else:
+                    continue
+                best = rank if best is None else min(best, rank)
+            if best is not None:
+                ranked.append((best, -rowid))
+                if len(ranked) >= _PATIENT_SEARCH_MAX_CANDIDATES:
+                    break
+        return [dict(self._docs[-neg_rowid]) for _, neg_rowid in heapq.nsmallest(limit, ranked)]
+
+    def _search_name(self, query, limit):
+        words = str(query).casefold().split()
+        grams = self._word_trigrams(query, pad_end=False)
+        if not grams:
+            return []
+        needed = max(1, math.ceil(len(grams) * _PATIENT_SEARCH_MIN_SIMILARITY))
+        ranked = []
+        for count, rowid in self._top_name_candidates(grams, needed):
+            name_words = str(self._docs[rowid].get('Name') or '').casefold().split()
+            prefix = all(any(name_word.startswith(word) for name_word in name_words) for word in words)
+            ranked.append((not prefix, -count, -rowid))
+        return [dict(self._docs[-neg_rowid]) for _, _, neg_rowid in heapq.nsmallest(limit, ranked)]
+
+
+_PATIENT_SEARCH_COLUMNS = 'ROWID, UUID, Name, Gender, Age, Phonenumber, AdharNumber'
+_patient_search_index = _PatientSearchIndex()
+_patient_search_lock = threading.Lock()
+# Held by the one request rebuilding the index; the Patient scan runs under it, not _patient_search_lock
+_patient_search_build_lock = threading.Lock()
+_patient_search_pending = None  # writes made during a rebuild, replayed onto the new index; None otherwise
+
+
+def _apply_patient_search_write(index, upsert=None, rowid=None, fields=None, remove=None):
+    if upsert is not None:
+        index.upsert(upsert)
+    if rowid is not None and fields:
+        index.update_fields(rowid, fields)
+    if remove is not None:
+        index.remove(remove)
+
+
+def _update_patient_search_index(upsert=None, rowid=None, fields=None, remove=None):
+    """Apply a Patient write to the search index, if it has been built, and queue it for a rebuild in progress."""
+    with _patient_search_lock:
+        if _patient_search_pending is not None:
+            _patient_search_pending.append((upsert, rowid, fields, remove))
+        if _patient_search_index.built_at is not None:
+            _apply_patient_search_write(_patient_search_index, upsert, rowid, fields, remove)
+
+
+def _patient_search_index_is_fresh(index):
+    return index.built_at is not None and time.monotonic() - index.built_at < _PATIENT_SEARCH_TTL_SECONDS
+
+
+def _current_patient_search_index(app):
+    """Return the search index, (re)building it when it is missing or older than the TTL.
+
+    The new index is built from a streamed scan into a separate object while writes and searches
+    carry on against the old one; writes made meanwhile are replayed onto it before it is swapped
+    in. Only one request rebuilds at a time, and while it does the others keep searching the stale
+    index (or wait for it, on a cold instance). Returns None when Patient is above
+    _PATIENT_SEARCH_MAX_INDEXED_ROWS, dropping any index already held.
+    """
+    global _patient_search_index, _patient_search_pending
+    index = _patient_search_index
+    if _patient_search_index_is_fresh(index):
+        return index
+    if not _patient_search_build_lock.acquire(blocking=index.built_at is None):
+        return index
+    try:
+        index = _patient_search_index
+        if _patient_search_index_is_fresh(index):
+            return index
+        zcql = app.zcql()
+        if _get_table_count(zcql, 'Patient') > _PATIENT_SEARCH_MAX_INDEXED_ROWS:
+            with _patient_search_lock:
+                _patient_search_index = _PatientSearchIndex()
+            return None
+        with _patient_search_lock:
+            _patient_search_pending = []
+        try:
+            rebuilt = _PatientSearchIndex()
+            rebuilt.build(_zcql_scan(zcql, 'Patient', _PATIENT_SEARCH_COLUMNS))
+            with _patient_search_lock:
+                for write in _patient_search_pending:
+                    _apply_patient_search_write(rebuilt, *write)
+                _patient_search_index = rebuilt
+        finally:
+            with _patient_search_lock:
+                _patient_search_pending = None
+        return rebuilt
+    finally:
+        _patient_search_build_lock.release()
+
+
+def _query_patient_search(zcql, query, limit):
+    """ZCQL fallback for /patient/search when Patient is too large to index: names starting a word
+    with the query, or numbers containing its digits, newest first. No typo matching."""
+    digits = _PatientSearchIndex._digits(query)
+    if len(digits) >= 3 and not any(ch.isalpha() for ch in query):
+        where = f"Phonenumber LIKE '*{digits}*' OR AdharNumber LIKE '*{digits}*'"
+    else:
+        term = query.replace('*', '').replace("'", "\\'")
+        where = f"Name LIKE '{term}*' OR Name LIKE '* {term}*'"
+    rows = zcql.execute_query(
+        f"SELECT {_PATIENT_SEARCH_COLUMNS} FROM Patient WHERE {where} ORDER BY ROWID DESC LIMIT 0,{limit}"
+    )
+    docs = (_PatientSearchIndex._make_doc(_unwrap_row(item, 'Patient')) for item in rows or [])
+    return [doc for _, doc in docs if doc is not None]
+
+
+def _search_patients(request: Request, app):
+    """Find patients by name (prefix/fuzzy) or partial phone/Aadhaar number (GET /patient/search?q=)."""
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return make_response(jsonify({'status': 'failure', 'error': 'Missing q query parameter'}), 400)
+    try:
+        limit = int(request.args.get('limit') or _PATIENT_SEARCH_DEFAULT_LIMIT)
+    except Exception:
+        limit = _PATIENT_SEARCH_DEFAULT_LIMIT
+    limit = max(1, min(limit, _PATIENT_SEARCH_MAX_LIMIT))
+
+    try:
+        index = _current_patient_search_index(app)
+        if index is None:
+            patients = _query_patient_search(app.zcql(), query, limit)
+        else:
+            with _patient_search_lock:
+                patients = index.search(query, limit)
+        return make_response(jsonify({'status': 'success', 'data': {'patients': patients}}), 200)
+    except Exception:
+        logger.exception('Failed to search patients')
+        return make_response(jsonify({'status': 'failure', 'error': 'Failed to search patients'}), 500)
+
+
+def _delete_prescription_cascade_internal(app, prescription_uuid):
     """Internal helper to delete a prescription and cascade delete all linked PrescribedMedicine entries.
     
     Args:
         app: Catalyst SDK app instance
-        zcql: ZCQL service instance
         prescription_uuid: UUID of the prescription to delete
     
     Returns:
         dict: {'success': bool, 'deletedPrescriptionRowIds': [], 'deletedMedicineRowIds': [], 'error': str}
     """
     try:
-        safe_uuid = str(prescription_uuid).replace("'", "\\'")
-        
         # Find the prescription ROWID
-        rows = zcql.execute_query(f"SELECT ROWID FROM Prescription WHERE UUID = '{safe_uuid}'")
-        row_ids = []
-        for r in rows or []:
-            if isinstance(r, dict) and len(r) == 1 and list(r.keys())[0] == 'Prescription':
-                inner = list(r.values())[0]
-                rid = inner.get('ROWID') or inner.get('id') or inner.get('Id')
-            else:
-                rid = r.get('ROWID') if isinstance(r, dict) else None
-            if rid:
-                row_ids.append(rid)
+        rows = app.loader('Prescription', 'UUID', 'ROWID, UUID').load_rows(prescription_uuid)
+        row_ids = [r.get('ROWID') for r in rows if r.get('ROWID')]
         
         if not row_ids:
             return {'success': False, 'error': f'No prescription found with UUID {prescription_uuid}'}
@@ -235,20 +1259,11 @@ def _delete_prescription_cascade_internal(app, zcql, prescription_uuid):
         # Cascade delete: First delete all PrescribedMedicine entries linked to this prescription
         deleted_meds = []
         try:
-            prescribed_meds = zcql.execute_query(f"SELECT ROWID FROM PrescribedMedicine WHERE PrescriptionUUID = '{safe_uuid}'")
             prescribed_med_table = app.datastore().table('PrescribedMedicine')
-            for pm in prescribed_meds or []:
-                if isinstance(pm, dict) and len(pm) == 1 and list(pm.keys())[0] == 'PrescribedMedicine':
-                    inner = list(pm.values())[0]
-                    pm_rid = inner.get('ROWID') or inner.get('id') or inner.get('Id')
-                else:
-                    pm_rid = pm.get('ROWID') if isinstance(pm, dict) else None
-                if pm_rid:
-                    try:
-                        prescribed_med_table.delete_row(pm_rid)
-                        deleted_meds.append(pm_rid)
-                    except Exception:
-                        logger.exception('Failed to delete PrescribedMedicine %s', pm_rid)
+            pm_rows = app.loader('PrescribedMedicine', 'PrescriptionUUID', 'ROWID, PrescriptionUUID').load_rows(prescription_uuid)
+            pm_rids = [pm.get('ROWID') for pm in pm_rows if pm.get('ROWID')]
+            deleted_meds = _delete_rows_bulk(prescribed_med_table, pm_rids)
+            _record_deletions(app, 'PrescribedMedicine', [(rid, None) for rid in deleted_meds])
         except Exception:
             logger.exception('Failed to cascade delete PrescribedMedicine entries')
         
@@ -262,6 +1277,8 @@ def _delete_prescription_cascade_internal(app, zcql, prescription_uuid):
                 deleted_prescriptions.append(rid)
             except Exception:
                 logger.exception('Failed to delete prescription %s', rid)
+        _adjust_table_count('Prescription', -len(deleted_prescriptions))
+        _record_deletions(app, 'Prescription', [(rid, prescription_uuid) for rid in deleted_prescriptions])
         
         return {
             'success': True,
@@ -273,6 +1290,74 @@ def _delete_prescription_cascade_internal(app, zcql, prescription_uuid):
         return {'success': False, 'error': str(e)}
 
 
+def _delete_prescriptions_cascade_bulk(app, prescription_rows):
+    """Delete many prescriptions and all their PrescribedMedicine entries in bulk.
+
+    Medicine ROWIDs for every prescription are gathered up front with chunked IN queries;
+    the medicine rows, then the prescription rows, are removed with delete_rows chunks sent
+    concurrently on a bounded thread pool. A prescription whose medicines could not all be
+    deleted is left in place and reported as failed.
+
+    Args:
+        app: Catalyst SDK app instance
+        prescription_rows: Prescription rows carrying ROWID and UUID
+
+    Returns:
+        tuple: (deleted prescription UUIDs, [{'uuid': ..., 'error': ...}] for failures)
+    """
+    rowid_by_uuid = {}
+    for row in prescription_rows:
+        rid = row.get('ROWID') or row.get('id') or row.get('Id')
+        if row.get('UUID') and rid:
+            rowid_by_uuid[row.get('UUID')] = rid
+    if not rowid_by_uuid:
+        return [], []
+
+    failed = {}  # {prescription_uuid: error}
+    owner_by_med_rowid = {}
+    try:
+        medicines_by_prescription = app.loader('PrescribedMedicine', 'PrescriptionUUID', 'ROWID, PrescriptionUUID').load_many(rowid_by_uuid)
+    except Exception as e:
+        logger.exception('Failed to look up PrescribedMedicine entries for cascade delete')
+        return [], [{'uuid': p_uuid, 'error': str(e)} for p_uuid in rowid_by_uuid]
+    for p_uuid, med_rows in medicines_by_prescription.items():
+        for med_row in med_rows:
+            med_rid = med_row.get('ROWID') or med_row.get('id') or med_row.get('Id')
+            if med_rid:
+                owner_by_med_rowid[str(med_rid)] = p_uuid
+
+    datastore_service = app.datastore()
+    medicine_table = datastore_service.table('PrescribedMedicine')
+    prescription_table = datastore_service.table('Prescription')
+
+    def delete_all(table, row_ids):
+        chunks = list(_chunked(row_ids, _DATASTORE_BATCH_SIZE))
+        if len(chunks) <= 1:
+            return [_delete_rows_bulk(table, chunk) for chunk in chunks]
+        with ThreadPoolExecutor(max_workers=min(_CASCADE_DELETE_WORKERS, len(chunks))) as pool:
+            return list(pool.map(lambda chunk: _delete_rows_bulk(table, chunk), chunks))
+
+    # Step 1: medicines of every prescription
+    med_rowids = list(owner_by_med_rowid)
+    deleted_med_rowids = {str(rid) for deleted in delete_all(medicine_table, med_rowids) for rid in deleted}
+    _record_deletions(app, 'PrescribedMedicine', [(rid, None) for rid in deleted_med_rowids])
+    for med_rid in med_rowids:
+        if med_rid not in deleted_med_rowids:
+            failed[owner_by_med_rowid[med_rid]] = f'Failed to delete PrescribedMedicine {med_rid}'
+
+    # Step 2: the prescriptions whose medicines are all gone
+    remaining = {str(rid): p_uuid for p_uuid, rid in rowid_by_uuid.items() if p_uuid not in failed}
+    deleted_prescription_rowids = {str(rid) for deleted in delete_all(prescription_table, list(remaining)) for rid in deleted}
+    for rid, p_uuid in remaining.items():
+        if rid not in deleted_prescription_rowids:
+            failed[p_uuid] = f'Failed to delete prescription {rid}'
+    _adjust_table_count('Prescription', -len(deleted_prescription_rowids))
+    _record_deletions(app, 'Prescription', [(rid, p_uuid) for rid, p_uuid in remaining.items() if rid in deleted_prescription_rowids])
+
+    deleted = [p_uuid for p_uuid in rowid_by_uuid if p_uuid not in failed]
+    return deleted, [{'uuid': p_uuid, 'error': error} for p_uuid, error in failed.items()]
+
+
 def _delete_patient(request: Request, app):
     """Delete patient by UUID with cascade delete of all prescriptions and their medicines."""
     uuid = request.args.get('UUID') or request.args.get('uuid')
@@ -283,20 +1368,9 @@ def _delete_patient(request: Request, app):
         }), 400)
     
     try:
-        zcql = app.zcql()
-        safe_uuid = str(uuid).replace("'", "\\'")
-        
         # Step 1: Validate that the patient exists
-        patient_rows = zcql.execute_query(f"SELECT ROWID FROM Patient WHERE UUID = '{safe_uuid}'")
-        patient_row_ids = []
-        for r in patient_rows or []:
-            if isinstance(r, dict) and len(r) == 1 and list(r.keys())[0] == 'Patient':
-                inner = list(r.values())[0]
-                rid = inner.get('ROWID') or inner.get('id') or inner.get('Id')
-            else:
-                rid = r.get('ROWID') if isinstance(r, dict) else None
-            if rid:
-                patient_row_ids.append(rid)
+        patient_rows = app.loader('Patient', 'UUID', 'ROWID, UUID').load_rows(uuid)
+        patient_row_ids = [r.get('ROWID') for r in patient_rows if r.get('ROWID')]
         
         if not patient_row_ids:
             return make_response(jsonify({
@@ -305,28 +1379,12 @@ def _delete_patient(request: Request, app):
             }), 404)
         
         # Step 2: Find all prescriptions for this patient
-        prescription_query = zcql.execute_query(f"SELECT UUID FROM Prescription WHERE PatientUUID = '{safe_uuid}'")
-        prescription_uuids = []
-        for item in prescription_query or []:
-            if isinstance(item, dict) and len(item) == 1 and list(item.keys())[0] == 'Prescription':
-                prescription_row = list(item.values())[0]
-            else:
-                prescription_row = item
-            
-            p_uuid = prescription_row.get('UUID')
-            if p_uuid:
-                prescription_uuids.append(p_uuid)
+        prescription_rows = app.loader('Prescription', 'PatientUUID', 'ROWID, UUID, PatientUUID').load_rows(uuid)
         
-        # Step 3: Delete all prescriptions (and their medicines) using cascade delete
-        deleted_prescriptions = []
-        failed_prescriptions = []
-        for p_uuid in prescription_uuids:
-            result = _delete_prescription_cascade_internal(app, zcql, p_uuid)
-            if result['success']:
-                deleted_prescriptions.append(p_uuid)
-            else:
-                failed_prescriptions.append({'uuid': p_uuid, 'error': result.get('error', 'Unknown error')})
-                logger.error(f"Failed to delete prescription {p_uuid}: {result.get('error')}")
+        # Step 3: Delete all prescriptions (and their medicines) with a bulk cascade delete
+        deleted_prescriptions, failed_prescriptions = _delete_prescriptions_cascade_bulk(app, prescription_rows)
+        for failure in failed_prescriptions:
+            logger.error(f"Failed to delete prescription {failure['uuid']}: {failure['error']}")
         
         # Step 4: If any prescription deletion failed, do not delete the patient
         if failed_prescriptions:
@@ -344,8 +1402,11 @@ def _delete_patient(request: Request, app):
             try:
                 patient_table.delete_row(rid)
                 deleted_patient_rows.append(rid)
+                _update_patient_search_index(remove=rid)
             except Exception:
                 logger.exception('Failed to delete patient row %s', rid)
+        _adjust_table_count('Patient', -len(deleted_patient_rows))
+        _record_deletions(app, 'Patient', [(rid, uuid) for rid in deleted_patient_rows])
         
         # Return success response
         resp = {
@@ -380,10 +1441,7 @@ def _create_prescription(request: Request, app):
 
     # Verify Patient exists by UUID
     try:
-        zcql = app.zcql()
-        safe_uuid = str(patient_uuid).replace("'", "\\'")
-        patient_exists = zcql.execute_query(f"SELECT ROWID FROM Patient WHERE UUID = '{safe_uuid}'")
-        if not patient_exists:
+        if app.loader('Patient', 'UUID', 'ROWID, UUID').load(patient_uuid) is None:
             return make_response(jsonify({'status': 'failure', 'error': 'Referenced Patient not found'}), 400)
     except Exception:
         logger.exception('Failed to verify referenced Patient')
@@ -401,6 +1459,7 @@ def _create_prescription(request: Request, app):
             'CurrentSymptoms': current_symptoms,
             'fees': fees
         })
+        _adjust_table_count('Prescription', 1)
 
         resp = {'status': 'success', 'data': {'UUID': prescription_uuid}}
         return make_response(jsonify(resp), 200)
@@ -409,67 +1468,75 @@ def _create_prescription(request: Request, app):
         return make_response(jsonify({'status': 'failure', 'error': 'Failed to create prescription'}), 500)
 
 
+_PRESCRIPTION_LIST_COLUMNS = 'ROWID, UUID, PatientUUID, OutsideMedicines, CurrentSymptoms, fees, CREATEDTIME'
+
+
+def _prescription_list_item(row):
+    """Shape a Prescription row the way the prescription list endpoints return it."""
+    return {
+        'ROWID': row.get('ROWID') or row.get('id') or row.get('Id'),
+        'UUID': row.get('UUID'),
+        'PatientUUID': row.get('PatientUUID'),
+        'OutsideMedicines': row.get('OutsideMedicines'),
+        'CurrentSymptoms': row.get('CurrentSymptoms'),
+        'fees': row.get('fees'),
+        'CREATEDTIME': row.get('CREATEDTIME')
+    }
+
+
+_PRESCRIPTION_FIELDSET = _Fieldset('ROWID', [(c, c) for c in _PRESCRIPTION_LIST_COLUMNS.split(', ')])
+
+
+def _get_prescriptions_batch(request: Request, app):
+    """Fetch many prescriptions by UUID (POST /prescription/batch); misses map to null."""
+    uuids, error = _parse_batch_uuids(request)
+    if error:
+        return make_response(jsonify({'status': 'failure', 'error': error}), 400)
+    try:
+        found = app.loader('Prescription', 'UUID', _PRESCRIPTION_LIST_COLUMNS).load_many(uuids)
+        prescriptions = {u: _prescription_list_item(found[u][0]) if u in found else None for u in uuids}
+        return make_response(jsonify({'status': 'success', 'data': {'prescriptions': prescriptions}}), 200)
+    except Exception:
+        logger.exception('Failed to batch fetch prescriptions')
+        return make_response(jsonify({'status': 'failure', 'error': 'Failed to fetch prescriptions'}), 500)
+
+
 def _list_prescriptions(request: Request, app):
     """Get all prescriptions."""
-    page = request.args.get('page')
-    per_page = request.args.get('perPage')
     try:
-        page = int(page) if page is not None else 1
-    except Exception:
-        page = 1
+        page, per_page, after_rowid = _parse_paging_args(request)
+    except ValueError:
+        return make_response(jsonify({'status': 'failure', 'error': 'Invalid cursor'}), 400)
     try:
-        per_page = int(per_page) if per_page is not None else 50
-    except Exception:
-        per_page = 50
+        fields = _PRESCRIPTION_FIELDSET.parse(request)
+    except ValueError as e:
+        return make_response(jsonify({'status': 'failure', 'error': str(e)}), 400)
 
     zcql_service = app.zcql()
     total = 0
     try:
-        row_count = zcql_service.execute_query(f"SELECT COUNT(ROWID) FROM Prescription")
-        if row_count:
-            first = row_count[0]
-            if isinstance(first, dict):
-                for v in first.values():
-                    if isinstance(v, dict):
-                        for vv in v.values():
-                            try:
-                                total = int(vv)
-                                break
-                            except Exception:
-                                continue
-                if total == 0:
-                    for k, vv in first.items():
-                        try:
-                            total = int(vv)
-                            break
-                        except Exception:
-                            continue
+        total = _get_table_count(zcql_service, 'Prescription', exact=_wants_exact_count(request))
         has_more = total > (page) * (per_page)
     except Exception:
         logger.exception('Failed to fetch Prescription total count')
         has_more = False
 
     try:
-        offset = (page - 1) * per_page
-        query_result = zcql_service.execute_query(f"SELECT ROWID, UUID, PatientUUID, OutsideMedicines, CurrentSymptoms, fees, CREATEDTIME FROM Prescription LIMIT {offset},{per_page}")
-        items = []
-        for item in query_result:
-            if isinstance(item, dict) and len(item) == 1 and list(item.keys())[0] == 'Prescription':
-                row = list(item.values())[0]
-            else:
-                row = item
-            items.append({
-                'ROWID': row.get('ROWID') or row.get('id') or row.get('Id'),
-                'UUID': row.get('UUID'),
-                'PatientUUID': row.get('PatientUUID'),
-                'OutsideMedicines': row.get('OutsideMedicines'),
-                'CurrentSymptoms': row.get('CurrentSymptoms'),
-                'fees': row.get('fees'),
-                'CREATEDTIME': row.get('CREATEDTIME')
-            })
+        columns = _PRESCRIPTION_FIELDSET.select_columns(fields, 'MODIFIEDTIME')
+        query_result = zcql_service.execute_query(_paged_select(f"SELECT {columns} FROM Prescription", page, per_page, after_rowid))
+        rows = [_unwrap_row(item, 'Prescription') for item in query_result]
+        etag = _row_etag('Prescription', rows, fields, page, per_page, after_rowid, total)
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag)
+        items = [_PRESCRIPTION_FIELDSET.shape(_prescription_list_item(row), fields) for row in rows]
+
+        if after_rowid is not None:
+            items, has_more, next_cursor = _keyset_page(items, per_page, 'ROWID')
+            resp = {'status': 'success', 'data': {'prescriptions': items, 'hasMore': has_more, 'perPage': per_page, 'total': total, 'nextCursor': next_cursor}}
+            return _set_row_etag(make_response(jsonify(resp), 200), etag)
 
         resp = {'status': 'success', 'data': {'prescriptions': items, 'hasMore': has_more, 'page': page, 'perPage': per_page, 'total': total}}
-        return make_response(jsonify(resp), 200)
+        return _set_row_etag(make_response(jsonify(resp), 200), etag)
     except Exception:
         logger.exception('Failed to query Prescription')
         return make_response(jsonify({'status': 'failure', 'error': 'Failed to fetch prescriptions'}), 500)
@@ -480,19 +1547,12 @@ def _get_prescription_by_uuid(request: Request, app, uuid):
     if not uuid:
         return make_response(jsonify({'status': 'failure', 'error': 'Missing UUID parameter'}), 400)
     try:
-        zcql = app.zcql()
-        safe_uuid = str(uuid).replace("'", "\\'")
-        query_result = zcql.execute_query(f"SELECT * FROM Prescription WHERE UUID = '{safe_uuid}'")
-        if query_result:
-            item = query_result[0]
-            if isinstance(item, dict) and len(item) == 1 and list(item.keys())[0] == 'Prescription':
-                row = list(item.values())[0]
-            else:
-                row = item
-            resp = {'status': 'success', 'data': {'prescription': row}}
-        else:
-            resp = {'status': 'success', 'data': {'prescription': None}}
-        return make_response(jsonify(resp), 200)
+        not_modified = _check_row_validator(request, app, 'Prescription', 'UUID', uuid)
+        if not_modified is not None:
+            return not_modified
+        row = app.loader('Prescription', 'UUID').load(uuid)
+        resp = {'status': 'success', 'data': {'prescription': row}}
+        return _set_row_etag(make_response(jsonify(resp), 200), _row_etag('Prescription', [row]))
     except Exception:
         logger.exception('Failed to query Prescription by UUID')
         return make_response(jsonify({'status': 'failure', 'error': 'Failed to fetch prescription'}), 500)
@@ -504,8 +1564,7 @@ def _delete_prescription(request: Request, app, uuid):
         return make_response(jsonify({'status': 'failure', 'error': 'Missing UUID parameter'}), 400)
     
     try:
-        zcql = app.zcql()
-        result = _delete_prescription_cascade_internal(app, zcql, uuid)
+        result = _delete_prescription_cascade_internal(app, uuid)
         
         if result['success']:
             return make_response(jsonify({
@@ -557,16 +1616,8 @@ def _update_patient(request: Request, app):
 
     try:
         zcql = app.zcql()
-        safe_phone = str(phone).replace("'", "\\'")
-        rows = zcql.execute_query(f"SELECT ROWID FROM Patient WHERE Phonenumber = '{safe_phone}'")
-        row_id = None
-        if rows:
-            first = rows[0]
-            if isinstance(first, dict) and len(first) == 1 and list(first.keys())[0] == 'Patient':
-                inner = list(first.values())[0]
-                row_id = inner.get('ROWID') or inner.get('id') or inner.get('Id')
-            else:
-                row_id = first.get('ROWID') if isinstance(first, dict) else None
+        existing = app.loader('Patient', 'Phonenumber').load(phone)
+        row_id = existing.get('ROWID') if existing else None
         if not row_id:
             return make_response(jsonify({'status': 'failure', 'error': 'Patient not found'}), 404)
 
@@ -585,6 +1636,7 @@ def _update_patient(request: Request, app):
                     safe_v = str(v).replace("'", "\\'")
                     set_clauses.append(f"{k}='{safe_v}'")
             zcql.execute_query(f"UPDATE Patient SET {', '.join(set_clauses)} WHERE ROWID = '{row_id}'")
+        _update_patient_search_index(rowid=row_id, fields=updates)
 
         return make_response(jsonify({'status': 'success', 'data': {'Phonenumber': phone}}), 200)
     except Exception:
@@ -608,17 +1660,8 @@ def _update_prescription(request: Request, app, uuid):
         return make_response(jsonify({'status': 'failure', 'error': 'No updatable fields provided'}), 400)
 
     try:
-        zcql = app.zcql()
-        safe_uuid = str(uuid).replace("'", "\\'")
-        rows = zcql.execute_query(f"SELECT ROWID FROM Prescription WHERE UUID = '{safe_uuid}'")
-        row_id = None
-        if rows:
-            first = rows[0]
-            if isinstance(first, dict) and len(first) == 1 and list(first.keys())[0] == 'Prescription':
-                inner = list(first.values())[0]
-                row_id = inner.get('ROWID') or inner.get('id') or inner.get('Id')
-            else:
-                row_id = first.get('ROWID') if isinstance(first, dict) else None
+        existing = app.loader('Prescription', 'UUID', 'ROWID, UUID').load(uuid)
+        row_id = existing.get('ROWID') if existing else None
         if not row_id:
             return make_response(jsonify({'status': 'failure', 'error': 'Prescription not found for UUID'}), 404)
 
@@ -635,7 +1678,7 @@ def _update_prescription(request: Request, app, uuid):
                 else:
                     safe_v = str(v).replace("'", "\\'")
                     set_clauses.append(f"{k}='{safe_v}'")
-            zcql.execute_query(f"UPDATE Prescription SET {', '.join(set_clauses)} WHERE ROWID = '{row_id}'")
+            app.zcql().execute_query(f"UPDATE Prescription SET {', '.join(set_clauses)} WHERE ROWID = '{row_id}'")
 
         return make_response(jsonify({'status': 'success', 'data': {'UUID': uuid}}), 200)
     except Exception:
@@ -670,25 +1713,30 @@ def _create_medicine(request: Request, app):
         price = None
 
     try:
-        zcql = app.zcql()
-        safe_name = str(name).replace("'", "\\'")
-        existing = zcql.execute_query(f"SELECT * FROM MedicineStock WHERE Name = '{safe_name}'")
-        if existing and len(existing) > 0:
+        if _lookup_stock_catalog(app, name) is not None:
             return make_response(jsonify({'status': 'failure', 'error': 'Medicine with this Name already exists'}), 409)
     except Exception:
         logger.exception('Failed to check MedicineStock uniqueness')
 
     table = app.datastore().table('MedicineStock')
     medicine_uuid = generate_uuid()
+    # The snapshot starts at the newest movement, so balance reads of the new row never scan
+    # older movements, and OpeningQuantity keeps the opening quantity for ledger replays
     row = table.insert_row({
         'Name': name,
         'Dosage': dosage,
         'Quantity': quantity,
+        'OpeningQuantity': quantity,
+        'LedgerRowId': _latest_rowid(app.zcql(), 'StockMovement'),
         'Category': category,
         'Price': price,
         'ManufacturerName': manufacturer,
         'UUID': medicine_uuid
     })
+    _adjust_table_count('MedicineStock', 1)
+    _invalidate_stock_catalog(name=name)
+    if isinstance(row, dict):
+        _update_medicine_suggest_index(upsert=row)
 
     row_id = None
     if isinstance(row, dict):
@@ -712,10 +1760,7 @@ def _create_prescribed_medicine(request: Request, app):
 
     # Verify Prescription exists by UUID
     try:
-        zcql = app.zcql()
-        safe_uuid = str(prescription_uuid).replace("'", "\\'")
-        prescription_exists = zcql.execute_query(f"SELECT ROWID FROM Prescription WHERE UUID = '{safe_uuid}'")
-        if not prescription_exists:
+        if app.loader('Prescription', 'UUID', 'ROWID, UUID').load(prescription_uuid) is None:
             return make_response(jsonify({'status': 'failure', 'error': 'Referenced Prescription not found'}), 400)
     except Exception:
         logger.exception('Failed to verify referenced Prescription')
@@ -748,16 +1793,8 @@ def _get_prescribed_medicines_by_prescription(request: Request, app, prescriptio
         return make_response(jsonify({'status': 'failure', 'error': 'Missing PrescriptionUUID parameter'}), 400)
     
     try:
-        zcql = app.zcql()
-        safe_uuid = str(prescription_uuid).replace("'", "\\'")
-        query_result = zcql.execute_query(f"SELECT * FROM PrescribedMedicine WHERE PrescriptionUUID = '{safe_uuid}'")
-        
         items = []
-        for item in query_result or []:
-            if isinstance(item, dict) and len(item) == 1 and list(item.keys())[0] == 'PrescribedMedicine':
-                row = list(item.values())[0]
-            else:
-                row = item
+        for row in app.loader('PrescribedMedicine', 'PrescriptionUUID').load_rows(prescription_uuid):
             items.append({
                 'ROWID': row.get('ROWID') or row.get('id') or row.get('Id'),
                 'PrescriptionUUID': row.get('PrescriptionUUID'),
@@ -775,62 +1812,147 @@ def _get_prescribed_medicines_by_prescription(request: Request, app, prescriptio
         return make_response(jsonify({'status': 'failure', 'error': 'Failed to fetch prescribed medicines'}), 500)
 
 
+_HISTORY_FIELDSET = _Fieldset('UUID', [
+    ('UUID', 'UUID'), ('PatientUUID', 'PatientUUID'), ('CurrentSymptoms', 'CurrentSymptoms'),
+    ('OutsideMedicines', 'OutsideMedicines'), ('fees', 'fees'), ('CREATEDTIME', 'CREATEDTIME'),
+    ('medicines', 'UUID')
+])
+
+
+def _prescription_history(app, prescription_rows, fields=None):
+    """Attach PrescribedMedicine lines to prescription rows, shaped as the patient history returns them.
+    With ``fields`` (see _HISTORY_FIELDSET) the visits are narrowed, and medicines are only read if asked for."""
+    # Get the medicines of every prescription in chunked IN queries instead of one query per visit
+    medicines_by_prescription = {}
+    if fields is None or 'medicines' in fields:
+        prescription_uuids = [p.get('UUID') for p in prescription_rows if p.get('UUID')]
+        medicines_by_prescription = app.loader('PrescribedMedicine', 'PrescriptionUUID').load_many(prescription_uuids)
+
+    prescriptions = []
+    for prescription_row in prescription_rows:
+        prescription_uuid = prescription_row.get('UUID')
+        medicines = []
+        for med_row in medicines_by_prescription.get(prescription_uuid, []):
+            medicines.append({
+                'ROWID': med_row.get('ROWID') or med_row.get('id') or med_row.get('Id'),
+                'MedicineName': med_row.get('MedicineName'),
+                'frequency': med_row.get('frequency'),
+                'Duration': med_row.get('Duration'),
+                'timing': med_row.get('timing')
+            })
+
+        prescriptions.append(_HISTORY_FIELDSET.shape({
+            'UUID': prescription_uuid,
+            'PatientUUID': prescription_row.get('PatientUUID'),
+            'CurrentSymptoms': prescription_row.get('CurrentSymptoms'),
+            'OutsideMedicines': prescription_row.get('OutsideMedicines'),
+            'fees': prescription_row.get('fees'),
+            'CREATEDTIME': prescription_row.get('CREATEDTIME'),
+            'medicines': medicines
+        }, fields))
+    return prescriptions
+
+
 def _get_prescriptions_by_patient(request: Request, app, patient_uuid):
     """Get all prescriptions with their medicines for a specific patient."""
     if not patient_uuid:
         return make_response(jsonify({'status': 'failure', 'error': 'Missing PatientUUID parameter'}), 400)
+    try:
+        fields = _HISTORY_FIELDSET.parse(request)
+    except ValueError as e:
+        return make_response(jsonify({'status': 'failure', 'error': str(e)}), 400)
     
     try:
-        zcql = app.zcql()
-        safe_uuid = str(patient_uuid).replace("'", "\\'")
-        
-        # Get all prescriptions for this patient
-        prescription_query = zcql.execute_query(f"SELECT * FROM Prescription WHERE PatientUUID = '{safe_uuid}' ORDER BY CREATEDTIME DESC")
-        
-        prescriptions = []
-        for item in prescription_query or []:
-            if isinstance(item, dict) and len(item) == 1 and list(item.keys())[0] == 'Prescription':
-                prescription_row = list(item.values())[0]
-            else:
-                prescription_row = item
-            
-            prescription_uuid = prescription_row.get('UUID')
-            
-            # Get all medicines for this prescription
-            medicines = []
-            if prescription_uuid:
-                safe_prescription_uuid = str(prescription_uuid).replace("'", "\\'")
-                medicine_query = zcql.execute_query(f"SELECT * FROM PrescribedMedicine WHERE PrescriptionUUID = '{safe_prescription_uuid}'")
-                
-                for med_item in medicine_query or []:
-                    if isinstance(med_item, dict) and len(med_item) == 1 and list(med_item.keys())[0] == 'PrescribedMedicine':
-                        med_row = list(med_item.values())[0]
-                    else:
-                        med_row = med_item
-                    
-                    medicines.append({
-                        'ROWID': med_row.get('ROWID') or med_row.get('id') or med_row.get('Id'),
-                        'MedicineName': med_row.get('MedicineName'),
-                        'frequency': med_row.get('frequency'),
-                        'Duration': med_row.get('Duration'),
-                        'timing': med_row.get('timing')
-                    })
-            
-            prescriptions.append({
-                'UUID': prescription_uuid,
-                'PatientUUID': prescription_row.get('PatientUUID'),
-                'CurrentSymptoms': prescription_row.get('CurrentSymptoms'),
-                'OutsideMedicines': prescription_row.get('OutsideMedicines'),
-                'fees': prescription_row.get('fees'),
-                'CREATEDTIME': prescription_row.get('CREATEDTIME'),
-                'medicines': medicines
-            })
-        
-        resp = {'status': 'success', 'data': prescriptions}
-        return make_response(jsonify(resp), 200)
+        # Get all prescriptions for this patient, newest first
+        columns = '*' if fields is None else _HISTORY_FIELDSET.select_columns(fields, 'PatientUUID', 'CREATEDTIME', 'MODIFIEDTIME')
+        prescription_rows = list(app.loader('Prescription', 'PatientUUID', columns).load_rows(patient_uuid))
+        prescription_rows.sort(key=lambda p: (str(p.get('CREATEDTIME') or ''), int(p.get('ROWID') or 0)), reverse=True)
+
+        # Tag the visits and their medicine lines before serializing; _prescription_history
+        # reuses the medicines loaded here from the request's loader
+        medicine_rows = []
+        if fields is None or 'medicines' in fields:
+            prescription_uuids = [p.get('UUID') for p in prescription_rows if p.get('UUID')]
+            loaded = app.loader('PrescribedMedicine', 'PrescriptionUUID').load_many(prescription_uuids)
+            medicine_rows = [row for rows in loaded.values() for row in rows]
+        etag = _row_etag('Prescription', prescription_rows, fields, _row_etag('PrescribedMedicine', medicine_rows))
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag)
+
+        resp = {'status': 'success', 'data': _prescription_history(app, prescription_rows, fields)}
+        return _set_row_etag(make_response(jsonify(resp), 200), etag)
+    except Exception:
+        logger.exception('Failed to query prescriptions by PatientUUID')
+        return make_response(jsonify({'status': 'failure', 'error': 'Failed to fetch patient prescriptions'}), 500)
+
+
+def _get_patient_chart(request: Request, app, patient_uuid):
+    """Patient row, visits with their medicines and current stock of every prescribed medicine in
+    one response (GET /patient/<uuid>/chart). ``visits=N`` limits it to the latest N visits.
+
+    The patient lookup runs concurrently with the visits -> medicines -> stock chain.
+    """
+    visits = request.args.get('visits')
+    try:
+        visits = int(visits) if visits is not None and str(visits) != '' else None
     except Exception:
-        logger.exception('Failed to query prescriptions by PatientUUID')
-        return make_response(jsonify({'status': 'failure', 'error': 'Failed to fetch patient prescriptions'}), 500)
+        return make_response(jsonify({'status': 'failure', 'error': 'visits must be a positive integer'}), 400)
+    if visits is not None and not 0 < visits < _ZCQL_MAX_ROWS:
+        return make_response(jsonify({'status': 'failure', 'error': f'visits must be between 1 and {_ZCQL_MAX_ROWS - 1}'}), 400)
+
+    try:
+        zcql = app.zcql()
+        patient_loader = app.loader('Patient', 'UUID', _PATIENT_LIST_COLUMNS)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            patient_future = executor.submit(patient_loader.load, patient_uuid)
+
+            if visits is None:
+                prescription_rows = list(app.loader('Prescription', 'PatientUUID').load_rows(patient_uuid))
+                prescription_rows.sort(key=lambda p: (str(p.get('CREATEDTIME') or ''), int(p.get('ROWID') or 0)), reverse=True)
+                has_more_visits = False
+            else:
+                # Only the latest N (+1 to detect more) visits are read
+                safe_uuid = str(patient_uuid).replace("'", "\\'")
+                query_result = zcql.execute_query(
+                    f"SELECT * FROM Prescription WHERE PatientUUID = '{safe_uuid}' "
+                    f"ORDER BY CREATEDTIME DESC LIMIT 0,{visits + 1}"
+                )
+                prescription_rows = [_unwrap_row(item, 'Prescription') for item in query_result or []]
+                has_more_visits = len(prescription_rows) > visits
+                prescription_rows = prescription_rows[:visits]
+
+            history = _prescription_history(app, prescription_rows)
+            names = {med['MedicineName'] for visit in history for med in visit['medicines'] if med.get('MedicineName')}
+            stock_by_name = _fetch_stock_by_names(app, names) if names else {}
+            stock_rows = list({id(row): row for row in stock_by_name.values()}.values())
+            balances = _fetch_stock_balances(zcql, stock_rows) if stock_rows else {}
+            patient_row = patient_future.result()
+
+        if patient_row is None:
+            return make_response(jsonify({'status': 'failure', 'error': 'No patient found with that UUID'}), 404)
+
+        stock = {}
+        for name in sorted(names, key=str):
+            stock_data = stock_by_name.get(str(name)) or stock_by_name.get(str(name).casefold())
+            if stock_data is None:
+                stock[name] = None
+                continue
+            row_id = stock_data.get('ROWID')
+            stock[name] = {
+                'medicineId': row_id,
+                'UUID': stock_data.get('UUID'),
+                'Quantity': balances.get(str(row_id), stock_data.get('Quantity'))
+            }
+
+        return make_response(jsonify({'status': 'success', 'data': {
+            'patient': _patient_list_item(patient_row),
+            'visits': history,
+            'hasMoreVisits': has_more_visits,
+            'stock': stock
+        }}), 200)
+    except Exception:
+        logger.exception('Failed to build patient chart')
+        return make_response(jsonify({'status': 'failure', 'error': 'Failed to fetch patient chart'}), 500)
 
 
 def _get_prescribed_medicine_by_rowid(request: Request, app, rowid):
@@ -907,6 +2029,7 @@ def _delete_prescribed_medicine(request: Request, app, rowid):
         table_service = datastore_service.table('PrescribedMedicine')
         
         table_service.delete_row(rowid)
+        _record_deletions(app, 'PrescribedMedicine', [(rowid, None)])
         
         return make_response(jsonify({'status': 'success', 'data': {'deletedRowId': rowid}}), 200)
     except Exception:
@@ -950,6 +2073,270 @@ def _calculate_total_quantity(duration, frequency):
         return 0
 
 
+def _stock_catalog_get(name):
+    """Cached MedicineStock row (without volatile columns) for a name, or None."""
+    key = str(name)
+    now = time.monotonic()
+    with _stock_catalog_lock:
+        cached = _stock_catalog.get(key)
+        if cached and now - cached[1] < _STOCK_CATALOG_TTL_SECONDS:
+            _stock_catalog.move_to_end(key)
+            _stock_catalog_stats['hits'] += 1
+            return dict(cached[0])
+        if cached:
+            del _stock_catalog[key]
+        _stock_catalog_stats['misses'] += 1
+        return None
+
+
+def _stock_catalog_put(name, row):
+    entry = {k: v for k, v in row.items() if k not in _STOCK_CATALOG_VOLATILE_COLUMNS}
+    with _stock_catalog_lock:
+        _stock_catalog[str(name)] = (entry, time.monotonic())
+        _stock_catalog.move_to_end(str(name))
+        while len(_stock_catalog) > _STOCK_CATALOG_MAX_ENTRIES:
+            _stock_catalog.popitem(last=False)
+            _stock_catalog_stats['evictions'] += 1
+
+
+def _invalidate_stock_catalog(name=None, rowid=None):
+    """Drop the catalog entries cached under ``name`` or pointing at MedicineStock ``rowid``."""
+    with _stock_catalog_lock:
+        stale = [key for key, (entry, _) in _stock_catalog.items()
+                 if (name is not None and key == str(name))
+                 or (rowid is not None and str(entry.get('ROWID')) == str(rowid))]
+        for key in stale:
+            del _stock_catalog[key]
+        _stock_catalog_stats['invalidations'] += len(stale)
+
+
+def _get_stock_catalog_stats():
+    """Snapshot of the catalog cache counters."""
+    with _stock_catalog_lock:
+        return dict(_stock_catalog_stats, size=len(_stock_catalog))
+
+
+def _lookup_stock_catalog(app, name):
+    """MedicineStock row for a name from the catalog, falling back to the request's Name loader.
+
+    The row's Quantity is not current on a cache hit; use _fetch_stock_by_names when it matters.
+    """
+    entry = _stock_catalog_get(name)
+    if entry is None:
+        entry = app.loader('MedicineStock', 'Name').load(name)
+        if entry is not None:
+            _stock_catalog_put(name, entry)
+    return entry
+
+
+def _fetch_stock_by_names(app, names):
+    """Look up MedicineStock rows for many names with current Quantity and LedgerRowId.
+
+    Names found in the catalog are re-read by ROWID in one query, so cached rows never supply
+    a stale quantity; the rest go through the request's Name loader (chunked IN queries) and
+    are added to the catalog.
+
+    Returns {name: row}, keyed by the requested name and also by its casefolded form so
+    callers can fall back to a case-insensitive match. The first row per name wins.
+    """
+    names = list(dict.fromkeys(str(n) for n in names))
+    found = {}
+    cached = {}
+    for name in names:
+        entry = _stock_catalog_get(name)
+        if entry is not None:
+            cached[name] = entry
+    if cached:
+        fresh_rows = _fetch_stock_rows_by_rowid(app.zcql(), [entry.get('ROWID') for entry in cached.values()])
+        fresh_by_rowid = {str(row.get('ROWID')): row for row in fresh_rows}
+        for name, entry in cached.items():
+            fresh = fresh_by_rowid.get(str(entry.get('ROWID')))
+            if fresh is None or str(fresh.get('Name')).casefold() != str(entry.get('Name')).casefold():
+                # Deleted or renamed since it was cached
+                _invalidate_stock_catalog(rowid=entry.get('ROWID'))
+                continue
+            found[name] = dict(entry, **fresh)
+
+    loaded = app.loader('MedicineStock', 'Name').load_many([name for name in names if name not in found])
+    for name, stock_rows in loaded.items():
+        _stock_catalog_put(name, stock_rows[0])
+        found[name] = stock_rows[0]
+
+    stock_by_name = {}
+    for name, stock_data in found.items():
+        stock_by_name.setdefault(name, stock_data)
+        stock_by_name.setdefault(name.casefold(), stock_data)
+    return stock_by_name
+
+
+class _InsufficientStockError(Exception):
+    """Raised when a stock deduction would take a medicine's balance below zero."""
+
+    def __init__(self, medicine_name, required, available):
+        super().__init__(f'Insufficient stock for: {medicine_name} (required {required}, available {available})')
+
+
+def _record_stock_ledger(event):
+    with _stock_ledger_stats_lock:
+        _stock_ledger_stats[event] += 1
+
+
+def _get_stock_ledger_stats():
+    """Snapshot of the stock ledger overdraft/compaction counters."""
+    with _stock_ledger_stats_lock:
+        return dict(_stock_ledger_stats)
+
+
+def _as_int(value, default=0):
+    try:
+        return int(value) if value is not None and str(value) != '' else default
+    except (ValueError, TypeError):
+        return default
+
+
+def _fetch_stock_rows_by_rowid(zcql, stock_rowids):
+    """Fetch MedicineStock rows (ROWID, Name, Quantity, LedgerRowId, MODIFIEDTIME) for many ROWIDs."""
+    stock_rows = []
+    for chunk in _chunked({str(rid) for rid in stock_rowids}, _ZCQL_IN_CHUNK_SIZE):
+        stock_query = zcql.execute_query(f"SELECT ROWID, Name, Quantity, LedgerRowId, MODIFIEDTIME FROM MedicineStock WHERE ROWID IN ({_zcql_in_list(chunk)})")
+        for stock_row in stock_query or []:
+            if isinstance(stock_row, dict) and len(stock_row) == 1 and list(stock_row.keys())[0] == 'MedicineStock':
+                stock_rows.append(list(stock_row.values())[0])
+            else:
+                stock_rows.append(stock_row)
+    return stock_rows
+
+
+def _fetch_stock_balances(zcql, stock_rows, compact=True):
+    """Current quantity of MedicineStock rows: the Quantity snapshot plus the deltas of every
+    StockMovement appended after the row's LedgerRowId.
+
+    Rows whose pending movements reach _LEDGER_COMPACT_THRESHOLD are compacted on the way
+    (unless ``compact`` is False), which keeps this read cheap.
+
+    Args:
+        zcql: ZCQL service instance
+        stock_rows: MedicineStock rows carrying ROWID, Quantity and LedgerRowId
+
+    Returns:
+        dict: {str(ROWID): balance}
+    """
+    watermarks = {}
+    for stock_data in stock_rows:
+        rowid = stock_data.get('ROWID') or stock_data.get('id') or stock_data.get('Id')
+        if rowid:
+            watermarks[str(rowid)] = _as_int(stock_data.get('LedgerRowId'))
+
+    # Each medicine's movements are read only past its own watermark: medicines sharing a
+    # watermark share an IN list, and the (IN list, watermark) terms of a scan are ORed
+    batches = []  # [{watermark: [StockRowId, ...]}]
+    batch_size = 0
+    for rid in sorted(watermarks, key=watermarks.get):
+        if not batches or batch_size >= _ZCQL_IN_CHUNK_SIZE or (
+                watermarks[rid] not in batches[-1] and len(batches[-1]) >= _LEDGER_SCAN_MAX_WATERMARKS):
+            batches.append({})
+            batch_size = 0
+        batches[-1].setdefault(watermarks[rid], []).append(rid)
+        batch_size += 1
+
+    pending = {}  # {str(StockRowId): [(movement ROWID, Delta), ...]}
+    for batch in batches:
+        where = '(' + ' OR '.join(
+            f"(StockRowId IN ({_zcql_in_list(rids)}) AND ROWID > {watermark})" for watermark, rids in batch.items()
+        ) + ')'
+        for movement in _zcql_scan(zcql, 'StockMovement', 'ROWID, StockRowId, Delta', where, after_rowid=min(batch)):
+            movement_rowid = _as_int(movement.get('ROWID'))
+            stock_rowid = str(movement.get('StockRowId'))
+            if movement_rowid > watermarks.get(stock_rowid, movement_rowid):
+                pending.setdefault(stock_rowid, []).append((movement_rowid, _as_int(movement.get('Delta'))))
+
+    balances = {}
+    for stock_data in stock_rows:
+        rowid = stock_data.get('ROWID') or stock_data.get('id') or stock_data.get('Id')
+        if not rowid:
+            continue
+        movements = pending.get(str(rowid), [])
+        balance = _as_int(stock_data.get('Quantity')) + sum(delta for _, delta in movements)
+        balances[str(rowid)] = balance
+        if compact and len(movements) >= _LEDGER_COMPACT_THRESHOLD:
+            _compact_stock_ledger(zcql, rowid, stock_data.get('LedgerRowId'), balance, max(m for m, _ in movements), stock_data.get('Quantity'))
+    return balances
+
+
+def _compact_stock_ledger(zcql, stock_rowid, ledger_rowid, balance, last_movement_rowid, snapshot_quantity=None):
+    """Fold pending movements into a MedicineStock snapshot.
+
+    The UPDATE is a compare-and-swap on LedgerRowId, so when two requests compact the same
+    row at once only one applies; the loser simply leaves it to the winner. Movements are
+    never deleted, so the ledger stays replayable from OpeningQuantity. A row that has never
+    been compacted (LedgerRowId empty, added before OpeningQuantity existed) still holds its
+    opening quantity in Quantity, so that snapshot is moved to OpeningQuantity in the same UPDATE.
+    """
+    try:
+        safe_rowid = str(stock_rowid).replace("'", "\\'")
+        if ledger_rowid is None or str(ledger_rowid) == '':
+            condition = 'LedgerRowId IS NULL'
+            opening = f", OpeningQuantity = {_as_int(snapshot_quantity)}"
+        else:
+            condition = f'LedgerRowId = {_as_int(ledger_rowid)}'
+            opening = ''
+        applied = zcql.execute_query(
+            f"UPDATE MedicineStock SET Quantity = {balance}, LedgerRowId = {last_movement_rowid}{opening} "
+            f"WHERE ROWID = '{safe_rowid}' AND {condition}"
+        )
+        _record_stock_ledger('compactions' if applied else 'compactionConflicts')
+    except Exception:
+        logger.exception('Failed to compact stock ledger for MedicineStock %s', stock_rowid)
+
+
+def _append_stock_movements(movement_table, movements, appended=None):
+    """Append StockMovement rows in bulk.
+
+    Each movement is a dict with StockRowId, MedicineName, Delta, Reason ('prescription',
+    'rollback', 'restock' or 'adjustment') and optionally PrescriptionUUID. Movements are
+    added to ``appended`` as each chunk is written so callers can reverse exactly what landed.
+    """
+    appended = [] if appended is None else appended
+    for chunk in _chunked(movements, _DATASTORE_BATCH_SIZE):
+        movement_table.insert_rows(chunk)
+        appended.extend(chunk)
+    return appended
+
+
+def _collect_created_medicine_rowids(zcql, prescription_uuid, created_medicine_rowids):
+    """Add ROWIDs of PrescribedMedicine rows written for a newly created prescription that
+    are missing from created_medicine_rowids (e.g. after a bulk insert failed part-way)."""
+    try:
+        safe_uuid = str(prescription_uuid).replace("'", "\\'")
+        known = {str(rid) for rid in created_medicine_rowids if rid}
+        for row in _zcql_scan(zcql, 'PrescribedMedicine', 'ROWID', f"PrescriptionUUID = '{safe_uuid}'"):
+            rid = row.get('ROWID')
+            if rid and str(rid) not in known:
+                created_medicine_rowids.append(rid)
+                known.add(str(rid))
+    except Exception:
+        logger.exception('Failed to look up PrescribedMedicine rows for %s', prescription_uuid)
+
+
+def _delete_rows_bulk(table, row_ids):
+    """Delete rows in chunks of _DATASTORE_BATCH_SIZE, falling back to row-by-row deletes
+    for a chunk the bulk call rejects. Returns the ROWIDs that were deleted."""
+    deleted = []
+    for chunk in _chunked(row_ids, _DATASTORE_BATCH_SIZE):
+        try:
+            table.delete_rows(chunk)
+            deleted.extend(chunk)
+        except Exception:
+            logger.exception('Bulk delete failed, deleting %s rows one at a time', len(chunk))
+            for rid in chunk:
+                try:
+                    table.delete_row(rid)
+                    deleted.append(rid)
+                except Exception:
+                    logger.exception('Failed to delete ROWID %s', rid)
+    return deleted
+
+
 def _save_prescription_atomic(request: Request, app):
     """Atomically save a prescription with its medicines (CREATE or UPDATE) and deduct medicine stock.
     
@@ -957,7 +2344,9 @@ def _save_prescription_atomic(request: Request, app):
     1. Stock validation: All medicines must have sufficient stock BEFORE any changes
     2. Stock deduction: Medicine stock is reduced atomically with prescription creation
     3. Rollback: On failure, all changes (prescription, medicines, stock) are rolled back
-    4. Concurrency: Optimistic concurrency control prevents negative stock from race conditions
+    4. Concurrency: Deductions are appended to the StockMovement ledger instead of rewriting
+       MedicineStock.Quantity, so concurrent prescriptions never overwrite each other; a
+       deduction that overdraws the balance is reversed and the save fails
     """
     req_data = request.get_json(silent=True) or {}
     prescription_uuid = req_data.get('UUID')
@@ -978,9 +2367,7 @@ def _save_prescription_atomic(request: Request, app):
     # Verify Patient exists by UUID
     try:
         zcql = app.zcql()
-        safe_patient_uuid = str(patient_uuid).replace("'", "\\'")
-        patient_exists = zcql.execute_query(f"SELECT ROWID FROM Patient WHERE UUID = '{safe_patient_uuid}'")
-        if not patient_exists:
+        if app.loader('Patient', 'UUID', 'ROWID, UUID').load(patient_uuid) is None:
             return make_response(jsonify({'status': 'failure', 'error': 'Referenced Patient not found'}), 400)
     except Exception:
         logger.exception('Failed to verify referenced Patient')
@@ -989,16 +2376,16 @@ def _save_prescription_atomic(request: Request, app):
     is_update = prescription_uuid is not None and prescription_uuid != ''
     created_prescription_uuid = None
     created_medicine_rowids = []
-    stock_deductions = []  # Track stock changes for rollback
+    stock_deductions = []  # StockMovement rows appended by this request, reversed on rollback
     prescription_table = app.datastore().table('Prescription')
     medicine_table = app.datastore().table('PrescribedMedicine')
-    stock_table = app.datastore().table('MedicineStock')
+    movement_table = app.datastore().table('StockMovement')
 
     try:
         # ===== STEP 1: VALIDATE STOCK AVAILABILITY FOR ALL MEDICINES =====
         # This must happen BEFORE any database changes to ensure atomicity
-        medicine_stock_info = []  # [(medicine_name, required_qty, current_stock, stock_rowid), ...]
-        
+        # Lines naming the same medicine are merged into a single required quantity
+        required_by_name = {}  # {medicine_name: total_required}, in request order
         for med in medicines:
             medicine_name = med.get('MedicineName')
             frequency = med.get('frequency')
@@ -1012,67 +2399,62 @@ def _save_prescription_atomic(request: Request, app):
             
             if total_required <= 0:
                 continue  # Skip medicines with 0 or invalid quantity
-            
-            # Fetch current stock for this medicine
+
+            required_by_name[medicine_name] = required_by_name.get(medicine_name, 0) + total_required
+
+        medicine_stock_info = []  # [{'name', 'required', 'current', 'rowid'}, ...]
+        if required_by_name:
+            # Fetch current stock for all medicines in one batched lookup
             try:
-                safe_name = str(medicine_name).replace("'", "\\'")
-                stock_query = zcql.execute_query(f"SELECT ROWID, Name, Quantity FROM MedicineStock WHERE Name = '{safe_name}'")
-                
-                if not stock_query or len(stock_query) == 0:
+                stock_by_name = _fetch_stock_by_names(app, list(required_by_name))
+                balances = _fetch_stock_balances(zcql, list({id(v): v for v in stock_by_name.values()}.values()))
+            except Exception as e:
+                names = ', '.join(str(n) for n in required_by_name)
+                logger.exception(f'Failed to check stock for medicines: {names}')
+                return make_response(jsonify({
+                    'status': 'failure',
+                    'error': f'Failed to verify stock for: {names}',
+                    'details': str(e)
+                }), 500)
+
+            # Names that differ only in case resolve to the same stock row, so the required
+            # quantities are merged per stock ROWID before they are checked
+            stock_info_by_rowid = {}
+            for medicine_name, total_required in required_by_name.items():
+                stock_data = stock_by_name.get(str(medicine_name))
+                if stock_data is None:
+                    stock_data = stock_by_name.get(str(medicine_name).casefold())
+                if stock_data is None:
                     return make_response(jsonify({
                         'status': 'failure',
                         'error': f'Medicine not found in stock: {medicine_name}'
                     }), 409)
                 
-                stock_row = stock_query[0]
-                if isinstance(stock_row, dict) and len(stock_row) == 1 and list(stock_row.keys())[0] == 'MedicineStock':
-                    stock_data = list(stock_row.values())[0]
-                else:
-                    stock_data = stock_row
-                
-                # Type conversion: Ensure Quantity is an integer
-                try:
-                    current_quantity = int(stock_data.get('Quantity', 0)) if stock_data.get('Quantity') is not None else 0
-                except (ValueError, TypeError):
-                    current_quantity = 0
-                
                 stock_rowid = stock_data.get('ROWID') or stock_data.get('id') or stock_data.get('Id')
-                
+                stock_info = stock_info_by_rowid.get(str(stock_rowid))
+                if stock_info is None:
+                    stock_info = stock_info_by_rowid[str(stock_rowid)] = {
+                        'name': stock_data.get('Name') or medicine_name,
+                        'required': 0,
+                        'current': balances.get(str(stock_rowid), 0),
+                        'rowid': stock_rowid
+                    }
+                stock_info['required'] += total_required
+
+            for stock_info in stock_info_by_rowid.values():
                 # Stock validation: Check sufficient quantity
-                if current_quantity < total_required:
+                if stock_info['current'] < stock_info['required']:
                     return make_response(jsonify({
                         'status': 'failure',
-                        'error': f'Insufficient stock for: {medicine_name} (required {total_required}, available {current_quantity})'
+                        'error': f"Insufficient stock for: {stock_info['name']} (required {stock_info['required']}, available {stock_info['current']})"
                     }), 409)
-                
-                medicine_stock_info.append({
-                    'name': medicine_name,
-                    'required': total_required,
-                    'current': current_quantity,
-                    'rowid': stock_rowid
-                })
-                
-            except Exception as e:
-                logger.exception(f'Failed to check stock for medicine: {medicine_name}')
-                return make_response(jsonify({
-                    'status': 'failure',
-                    'error': f'Failed to verify stock for: {medicine_name}',
-                    'details': str(e)
-                }), 500)
+                medicine_stock_info.append(stock_info)
         
         # ===== STEP 2: CREATE or UPDATE PRESCRIPTION =====
         if is_update:
             # UPDATE mode
-            safe_uuid = str(prescription_uuid).replace("'", "\\'")
-            rows = zcql.execute_query(f"SELECT ROWID FROM Prescription WHERE UUID = '{safe_uuid}'")
-            prescription_rowid = None
-            if rows:
-                first = rows[0]
-                if isinstance(first, dict) and len(first) == 1 and list(first.keys())[0] == 'Prescription':
-                    inner = list(first.values())[0]
-                    prescription_rowid = inner.get('ROWID') or inner.get('id') or inner.get('Id')
-                else:
-                    prescription_rowid = first.get('ROWID') if isinstance(first, dict) else None
+            existing = app.loader('Prescription', 'UUID', 'ROWID, UUID').load(prescription_uuid)
+            prescription_rowid = existing.get('ROWID') if existing else None
             
             if not prescription_rowid:
                 return make_response(jsonify({'status': 'failure', 'error': 'Prescription not found for UUID'}), 404)
@@ -1109,51 +2491,46 @@ def _save_prescription_atomic(request: Request, app):
                 'CurrentSymptoms': current_symptoms,
                 'fees': fees
             })
+            _adjust_table_count('Prescription', 1)
+            if isinstance(row, dict) and row.get('ROWID'):
+                app.loader('Prescription', 'UUID', 'ROWID, UUID').prime(created_prescription_uuid, row)
 
         # ===== STEP 3: DELETE REMOVED MEDICINES (UPDATE MODE ONLY) =====
         if is_update and deleted_medicine_rowids:
             for rowid in deleted_medicine_rowids:
                 try:
                     medicine_table.delete_row(rowid)
+                    _record_deletions(app, 'PrescribedMedicine', [(rowid, None)])
                 except Exception:
                     logger.exception('Failed to delete medicine ROWID %s during atomic save', rowid)
                     # Continue with other deletions
 
-        # ===== STEP 4: DEDUCT STOCK ATOMICALLY =====
-        # Deduct stock for each medicine with optimistic concurrency control
-        for stock_info in medicine_stock_info:
-            try:
-                stock_rowid = stock_info['rowid']
-                required_qty = stock_info['required']
-                current_qty = stock_info['current']
-                medicine_name = stock_info['name']
-                new_quantity = current_qty - required_qty
-                
-                # Ensure non-negative stock (double-check for race conditions)
-                if new_quantity < 0:
-                    raise ValueError(f'Stock became negative for {medicine_name}')
-                
-                # Update stock quantity
-                try:
-                    stock_table.update_row(stock_rowid, {'Quantity': new_quantity})
-                except Exception:
-                    # Fallback to ZCQL update
-                    safe_rowid = str(stock_rowid).replace("'", "\\'")
-                    zcql.execute_query(f"UPDATE MedicineStock SET Quantity = {new_quantity} WHERE ROWID = '{safe_rowid}'")
-                
-                # Track for rollback
-                stock_deductions.append({
-                    'rowid': stock_rowid,
-                    'previous_qty': current_qty,
-                    'new_qty': new_quantity
-                })
-                
-            except Exception as e:
-                logger.exception(f'Failed to deduct stock for {medicine_name}')
-                raise  # Trigger rollback
+        # ===== STEP 4: DEDUCT STOCK VIA THE LEDGER =====
+        # Deductions are appended as StockMovement rows, so concurrent prescriptions never
+        # contend on the MedicineStock row. Balances are re-read afterwards: if another request
+        # got there first and a balance went negative, the rollback below reverses ours.
+        if medicine_stock_info:
+            _append_stock_movements(movement_table, [{
+                'StockRowId': stock_info['rowid'],
+                'MedicineName': stock_info['name'],
+                'Delta': -stock_info['required'],
+                'Reason': 'prescription',
+                'PrescriptionUUID': created_prescription_uuid
+            } for stock_info in medicine_stock_info], stock_deductions)
+
+            stock_rows = _fetch_stock_rows_by_rowid(zcql, [stock_info['rowid'] for stock_info in medicine_stock_info])
+            balances = _fetch_stock_balances(zcql, stock_rows)
+            for stock_info in medicine_stock_info:
+                remaining = balances.get(str(stock_info['rowid']), 0)
+                if remaining < 0:
+                    _record_stock_ledger('overdrafts')
+                    # Concurrent saves can leave less than nothing before ours; report none available
+                    raise _InsufficientStockError(stock_info['name'], stock_info['required'], max(0, remaining + stock_info['required']))
+                stock_info['remaining'] = remaining
 
         # ===== STEP 5: INSERT OR UPDATE PRESCRIBED MEDICINES =====
         saved_medicines = []
+        new_medicine_rows = []  # [(index into saved_medicines, row to insert), ...]
         for med in medicines:
             med_rowid = med.get('ROWID')
             medicine_name = med.get('MedicineName')
@@ -1199,27 +2576,39 @@ def _save_prescription_atomic(request: Request, app):
                         'timing': timing
                     })
             else:
-                # INSERT new medicine
-                row = medicine_table.insert_row({
-                    'PrescriptionUUID': created_prescription_uuid,
+                # INSERT new medicine (written in bulk below, ROWID filled in afterwards)
+                saved_medicines.append({
+                    'ROWID': None,
                     'MedicineName': medicine_name,
                     'frequency': frequency,
                     'Duration': duration,
                     'timing': timing
                 })
-                
-                new_rowid = None
-                if isinstance(row, dict):
-                    new_rowid = row.get('ROWID') or row.get('id') or row.get('Id') or row.get('ROW_ID')
-                
-                created_medicine_rowids.append(new_rowid)
-                saved_medicines.append({
-                    'ROWID': new_rowid,
+                new_medicine_rows.append((len(saved_medicines) - 1, {
+                    'PrescriptionUUID': created_prescription_uuid,
                     'MedicineName': medicine_name,
                     'frequency': frequency,
                     'Duration': duration,
                     'timing': timing
-                })
+                }))
+
+        for chunk in _chunked(new_medicine_rows, _DATASTORE_BATCH_SIZE):
+            try:
+                inserted = medicine_table.insert_rows([row for _, row in chunk]) or []
+            except Exception:
+                # Part of the chunk may have been written before the failure; pick those rows
+                # up so the rollback below removes them too
+                if not is_update:
+                    _collect_created_medicine_rowids(zcql, created_prescription_uuid, created_medicine_rowids)
+                raise
+            for (index, _), row in zip(chunk, inserted):
+                new_rowid = None
+                if isinstance(row, dict):
+                    new_rowid = row.get('ROWID') or row.get('id') or row.get('Id') or row.get('ROW_ID')
+                created_medicine_rowids.append(new_rowid)
+                saved_medicines[index]['ROWID'] = new_rowid
+            if len(inserted) < len(chunk):
+                raise ValueError(f'Bulk insert saved {len(inserted)} of {len(chunk)} prescribed medicines')
 
         # ===== SUCCESS RESPONSE =====
         # Include updated medicine stock information
@@ -1227,7 +2616,7 @@ def _save_prescription_atomic(request: Request, app):
         for stock_info in medicine_stock_info:
             updated_medicines_stock.append({
                 'Name': stock_info['name'],
-                'Quantity': stock_info['current'] - stock_info['required']
+                'Quantity': stock_info['remaining']
             })
         
         return make_response(jsonify({
@@ -1247,46 +2636,36 @@ def _save_prescription_atomic(request: Request, app):
         logger.exception('Failed to save prescription atomically')
         
         # ===== ROLLBACK LOGIC =====
-        # Rollback stock deductions
+        # Rollback stock deductions by appending reversing movements
         if stock_deductions:
-            for stock_info in stock_deductions:
-                try:
-                    stock_rowid = stock_info['rowid']
-                    previous_qty = stock_info['previous_qty']
-                    try:
-                        stock_table.update_row(stock_rowid, {'Quantity': previous_qty})
-                    except Exception:
-                        safe_rowid = str(stock_rowid).replace("'", "\\'")
-                        zcql.execute_query(f"UPDATE MedicineStock SET Quantity = {previous_qty} WHERE ROWID = '{safe_rowid}'")
-                except Exception:
-                    logger.exception('Failed to rollback stock for ROWID %s', stock_info.get('rowid'))
+            try:
+                _append_stock_movements(movement_table, [{
+                    'StockRowId': movement['StockRowId'],
+                    'MedicineName': movement['MedicineName'],
+                    'Delta': -movement['Delta'],
+                    'Reason': 'rollback',
+                    'PrescriptionUUID': movement['PrescriptionUUID']
+                } for movement in stock_deductions])
+            except Exception:
+                logger.exception('Failed to rollback stock deductions %s', stock_deductions)
         
         # Rollback prescription and medicines (CREATE mode only)
         if not is_update and created_prescription_uuid:
             try:
                 # Delete created medicines
-                for rowid in created_medicine_rowids:
-                    if rowid:
-                        try:
-                            medicine_table.delete_row(rowid)
-                        except Exception:
-                            logger.exception('Failed to rollback medicine ROWID %s', rowid)
+                _delete_rows_bulk(medicine_table, [rowid for rowid in created_medicine_rowids if rowid])
                 
                 # Delete created prescription
-                safe_uuid = str(created_prescription_uuid).replace("'", "\\'")
-                prescription_rows = zcql.execute_query(f"SELECT ROWID FROM Prescription WHERE UUID = '{safe_uuid}'")
-                if prescription_rows:
-                    first = prescription_rows[0]
-                    if isinstance(first, dict) and len(first) == 1 and list(first.keys())[0] == 'Prescription':
-                        inner = list(first.values())[0]
-                        p_rowid = inner.get('ROWID') or inner.get('id') or inner.get('Id')
-                    else:
-                        p_rowid = first.get('ROWID') if isinstance(first, dict) else None
-                    if p_rowid:
-                        prescription_table.delete_row(p_rowid)
+                created = app.loader('Prescription', 'UUID', 'ROWID, UUID').load(created_prescription_uuid)
+                p_rowid = created.get('ROWID') if created else None
+                if p_rowid:
+                    prescription_table.delete_row(p_rowid)
+                    _adjust_table_count('Prescription', -1)
             except Exception:
                 logger.exception('Failed to rollback prescription creation')
         
+        if isinstance(e, _InsufficientStockError):
+            return make_response(jsonify({'status': 'failure', 'error': str(e)}), 409)
         return make_response(jsonify({
             'status': 'failure',
             'error': 'Failed to save prescription',
@@ -1294,65 +2673,60 @@ def _save_prescription_atomic(request: Request, app):
         }), 500)
 
 
+_MEDICINE_FIELDSET = _Fieldset('medicineId', [
+    ('medicineId', 'ROWID'), ('UUID', 'UUID'), ('Name', 'Name'), ('Dosage', 'Dosage'),
+    ('Quantity', 'Quantity, LedgerRowId'), ('Category', 'Category'), ('Price', 'Price'),
+    ('ManufacturerName', 'ManufacturerName')
+])
+
+
 def _list_medicines(request: Request, app):
-    page = request.args.get('page')
-    per_page = request.args.get('perPage')
     try:
-        page = int(page) if page is not None else 1
-    except Exception:
-        page = 1
+        page, per_page, after_rowid = _parse_paging_args(request)
+    except ValueError:
+        return make_response(jsonify({'status': 'failure', 'error': 'Invalid cursor'}), 400)
     try:
-        per_page = int(per_page) if per_page is not None else 50
-    except Exception:
-        per_page = 50
+        fields = _MEDICINE_FIELDSET.parse(request)
+    except ValueError as e:
+        return make_response(jsonify({'status': 'failure', 'error': str(e)}), 400)
 
     zcql_service = app.zcql()
     total = 0
     try:
-        row_count = zcql_service.execute_query(f"SELECT COUNT(ROWID) FROM MedicineStock")
-        if row_count:
-            first = row_count[0]
-            if isinstance(first, dict):
-                for v in first.values():
-                    if isinstance(v, dict):
-                        for vv in v.values():
-                            try:
-                                total = int(vv)
-                                break
-                            except Exception:
-                                continue
-                if total == 0:
-                    for k, vv in first.items():
-                        try:
-                            total = int(vv)
-                            break
-                        except Exception:
-                            continue
+        total = _get_table_count(zcql_service, 'MedicineStock', exact=_wants_exact_count(request))
         has_more = total > (page) * (per_page)
     except Exception:
         logger.exception('Failed to fetch MedicineStock total count')
         has_more = False
 
     try:
-        offset = (page - 1) * per_page
-        query_result = zcql_service.execute_query(f"SELECT ROWID, Name, Dosage, Quantity, Category, Price, ManufacturerName, UUID FROM MedicineStock LIMIT {offset},{per_page}")
+        columns = _MEDICINE_FIELDSET.select_columns(fields, 'MODIFIEDTIME')
+        query_result = zcql_service.execute_query(_paged_select(f"SELECT {columns} FROM MedicineStock", page, per_page, after_rowid))
+        rows = [_unwrap_row(item, 'MedicineStock') for item in query_result]
+        # Quantity is the snapshot plus movements appended to the stock ledger since
+        with_quantity = fields is None or 'Quantity' in fields
+        balances = _fetch_stock_balances(zcql_service, rows) if rows and with_quantity else {}
+        etag = _row_etag('MedicineStock', rows, fields, page, per_page, after_rowid, total,
+                         *(balances.get(str(row.get('ROWID'))) for row in rows))
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag)
         items = []
-        for item in query_result:
-            if isinstance(item, dict) and len(item) == 1 and list(item.keys())[0] == 'MedicineStock':
-                row = list(item.values())[0]
-            else:
-                row = item
-            items.append({
-                'medicineId': row.get('ROWID') or row.get('id') or row.get('Id'),
+        for row in rows:
+            row_id = row.get('ROWID') or row.get('id') or row.get('Id')
+            items.append(_MEDICINE_FIELDSET.shape({
+                'medicineId': row_id,
                 'UUID': row.get('UUID'),
                 'Name': row.get('Name'),
                 'Dosage': row.get('Dosage'),
-                'Quantity': row.get('Quantity'),
+                'Quantity': balances.get(str(row_id), row.get('Quantity')),
                 'Category': row.get('Category'),
                 'Price': row.get('Price'),
                 'ManufacturerName': row.get('ManufacturerName')
-            })
-        return make_response(jsonify({'status': 'success', 'data': {'medicines': items, 'hasMore': has_more, 'page': page, 'perPage': per_page, 'total': total}}), 200)
+            }, fields))
+        if after_rowid is not None:
+            items, has_more, next_cursor = _keyset_page(items, per_page, 'medicineId')
+            return _set_row_etag(make_response(jsonify({'status': 'success', 'data': {'medicines': items, 'hasMore': has_more, 'perPage': per_page, 'total': total, 'nextCursor': next_cursor}}), 200), etag)
+        return _set_row_etag(make_response(jsonify({'status': 'success', 'data': {'medicines': items, 'hasMore': has_more, 'page': page, 'perPage': per_page, 'total': total}}), 200), etag)
     except Exception:
         logger.exception('Failed to query MedicineStock')
         return make_response(jsonify({'status': 'failure', 'error': 'Failed to fetch medicines'}), 500)
@@ -1364,17 +2738,17 @@ def _get_medicine_by_name(request: Request, app):
         return make_response(jsonify({'status': 'failure', 'error': 'Missing Name query parameter'}), 400)
     try:
         zcql = app.zcql()
-        safe_name = str(name).replace("'", "\\'")
-        query_result = zcql.execute_query(f"SELECT * FROM MedicineStock WHERE Name = '{safe_name}'")
-        if query_result:
-            item = query_result[0]
-            if isinstance(item, dict) and len(item) == 1 and list(item.keys())[0] == 'MedicineStock':
-                row = list(item.values())[0]
-            else:
-                row = item
-            return make_response(jsonify({'status': 'success', 'data': {'medicine': row}}), 200)
-        else:
-            return make_response(jsonify({'status': 'success', 'data': {'medicine': None}}), 200)
+        # The catalog serves the descriptive columns, so the only reads here are the row's
+        # ROWID/MODIFIEDTIME/Quantity and its ledger balance, which are also its validator
+        row = _fetch_stock_by_names(app, [name]).get(str(name))
+        if row is not None:
+            row = dict(row)
+            row_id = row.get('ROWID') or row.get('id') or row.get('Id')
+            row['Quantity'] = _fetch_stock_balances(zcql, [row]).get(str(row_id), row.get('Quantity'))
+        etag = _row_etag('MedicineStock', [row], row['Quantity'] if row is not None else None)
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag)
+        return _set_row_etag(make_response(jsonify({'status': 'success', 'data': {'medicine': row}}), 200), etag)
     except Exception:
         logger.exception('Failed to query MedicineStock by Name')
         return make_response(jsonify({'status': 'failure', 'error': 'Failed to fetch medicine'}), 500)
@@ -1386,18 +2760,8 @@ def _delete_medicine(request: Request, app):
     table_service = datastore_service.table('MedicineStock')
     if uuid:
         try:
-            zcql = app.zcql()
-            safe_uuid = str(uuid).replace("'", "\\'")
-            rows = zcql.execute_query(f"SELECT ROWID FROM MedicineStock WHERE UUID = '{safe_uuid}'")
-            row_ids = []
-            for r in rows or []:
-                if isinstance(r, dict) and len(r) == 1 and list(r.keys())[0] == 'MedicineStock':
-                    inner = list(r.values())[0]
-                    rid = inner.get('ROWID') or inner.get('id') or inner.get('Id')
-                else:
-                    rid = r.get('ROWID') if isinstance(r, dict) else None
-                if rid:
-                    row_ids.append(rid)
+            rows = app.loader('MedicineStock', 'UUID', 'ROWID, UUID').load_rows(uuid)
+            row_ids = [r.get('ROWID') for r in rows if r.get('ROWID')]
             if not row_ids:
                 return make_response(jsonify({'status': 'failure', 'error': 'No medicine found with that UUID'}), 404)
             deleted = []
@@ -1405,8 +2769,12 @@ def _delete_medicine(request: Request, app):
                 try:
                     table_service.delete_row(rid)
                     deleted.append(rid)
+                    _invalidate_stock_catalog(rowid=rid)
+                    _update_medicine_suggest_index(remove=rid)
                 except Exception:
                     logger.exception('Failed to delete medicine %s', rid)
+            _adjust_table_count('MedicineStock', -len(deleted))
+            _record_deletions(app, 'MedicineStock', [(rid, uuid) for rid in deleted])
             return make_response(jsonify({'status': 'success', 'data': {'deletedRowIds': deleted}}), 200)
         except Exception:
             logger.exception('Failed to delete MedicineStock by UUID')
@@ -1447,33 +2815,44 @@ def _update_medicine(request: Request, app):
 
     try:
         zcql = app.zcql()
-        safe_uuid = str(uuid).replace("'", "\\'")
-        rows = zcql.execute_query(f"SELECT ROWID FROM MedicineStock WHERE UUID = '{safe_uuid}'")
-        row_id = None
-        if rows:
-            first = rows[0]
-            if isinstance(first, dict) and len(first.keys()) == 1 and list(first.keys())[0] == 'MedicineStock':
-                inner = list(first.values())[0]
-                row_id = inner.get('ROWID') or inner.get('id') or inner.get('Id')
-            else:
-                row_id = first.get('ROWID') if isinstance(first, dict) else None
+        existing = app.loader('MedicineStock', 'UUID', 'ROWID, UUID').load(uuid)
+        row_id = existing.get('ROWID') if existing else None
         if not row_id:
             return make_response(jsonify({'status': 'failure', 'error': 'Medicine not found for UUID'}), 404)
 
+        # Quantity is never overwritten in place: the difference to the current balance is
+        # appended to the stock ledger as a restock or adjustment movement
+        target_quantity = updates.pop('Quantity', None)
+
         table = app.datastore().table('MedicineStock')
-        try:
-            table.update_row(row_id, updates)
-        except Exception:
-            set_clauses = []
-            for k, v in updates.items():
-                if v is None:
-                    set_clauses.append(f"{k}=NULL")
-                elif isinstance(v, (int, float)):
-                    set_clauses.append(f"{k}={v}")
-                else:
-                    safe_v = str(v).replace("'", "\\'")
-                    set_clauses.append(f"{k}='{safe_v}'")
-            zcql.execute_query(f"UPDATE MedicineStock SET {', '.join(set_clauses)} WHERE ROWID = '{row_id}'")
+        if updates:
+            try:
+                table.update_row(row_id, updates)
+            except Exception:
+                set_clauses = []
+                for k, v in updates.items():
+                    if v is None:
+                        set_clauses.append(f"{k}=NULL")
+                    elif isinstance(v, (int, float)):
+                        set_clauses.append(f"{k}={v}")
+                    else:
+                        safe_v = str(v).replace("'", "\\'")
+                        set_clauses.append(f"{k}='{safe_v}'")
+                zcql.execute_query(f"UPDATE MedicineStock SET {', '.join(set_clauses)} WHERE ROWID = '{row_id}'")
+            _invalidate_stock_catalog(rowid=row_id)
+            _update_medicine_suggest_index(rowid=row_id, fields=updates)
+
+        if target_quantity is not None:
+            stock_rows = _fetch_stock_rows_by_rowid(zcql, [row_id])
+            delta = target_quantity - _fetch_stock_balances(zcql, stock_rows).get(str(row_id), 0)
+            if delta:
+                _append_stock_movements(app.datastore().table('StockMovement'), [{
+                    'StockRowId': row_id,
+                    'MedicineName': stock_rows[0].get('Name') if stock_rows else updates.get('Name'),
+                    'Delta': delta,
+                    'Reason': 'restock' if delta > 0 else 'adjustment',
+                    'PrescriptionUUID': None
+                }])
 
         return make_response(jsonify({'status': 'success', 'data': {'medicineId': uuid}}), 200)
     except Exception:
@@ -1481,6 +2860,586 @@ def _update_medicine(request: Request, app):
         return make_response(jsonify({'status': 'failure', 'error': 'Failed to update medicine'}), 500)
 
 
+class _MedicineSuggestIndex:
+    """Prefix index over MedicineStock Name, Category and ManufacturerName.
+
+    Terms are kept in sorted lists of (term, ROWID) and searched with bisect. Every field
+    value is indexed whole and from each word onwards, so 'para' finds 'Dolo Paracetamol'.
+    Name terms live in their own list and are ranked ahead of category/manufacturer terms.
+    Not thread-safe; the shared instance is only used under _medicine_suggest_lock.
+    """
+
+    def __init__(self):
+        self.built_at = None
+        self._docs = {}  # {rowid: suggestion dict}
+        self._name_terms = []
+        self._other_terms = []
+
+    @staticmethod
+    def _field_terms(value):
+        words = str(value or '').casefold().split()
+        return {' '.join(words[i:]) for i in range(len(words))}
+
+    def _doc_terms(self, doc):
+        other = self._field_terms(doc.get('Category')) | self._field_terms(doc.get('ManufacturerName'))
+        return self._field_terms(doc.get('Name')), other
+
+    def build(self, rows):
+        self._docs = {}
+        name_terms, other_terms = [], []
+        for row in rows:
+            rowid, doc = self._make_doc(row)
+            if doc is None:
+                continue
+            self._docs[rowid] = doc
+            names, others = self._doc_terms(doc)
+            name_terms.extend((term, rowid) for term in names)
+            other_terms.extend((term, rowid) for term in others)
+        self._name_terms = sorted(name_terms)
+        self._other_terms = sorted(other_terms)
+        self.built_at = time.monotonic()
+
+    @staticmethod
+    def _make_doc(row):
+        """(integer ROWID the terms refer to, suggestion), or (None, None) without a ROWID.
+        The suggestion keeps the datastore's string ROWID."""
+        rowid = _as_int(row.get('ROWID'), None)
+        if rowid is None:
+            return None, None
+        return rowid, {
+            'ROWID': str(row.get('ROWID')),
+            'UUID': row.get('UUID'),
+            'Name': row.get('Name'),
+            'Dosage': row.get('Dosage'),
+            'Category': row.get('Category'),
+            'ManufacturerName': row.get('ManufacturerName')
+        }
+
+    def upsert(self, row):
+        rowid, doc = self._make_doc(row)
+        if doc is None:
+            return
+        self.remove(rowid)
+        self._docs[rowid] = doc
+        names, others = self._doc_terms(doc)
+        for term in names:
+            bisect.insort(self._name_terms, (term, rowid))
+        for term in others:
+            bisect.insort(self._other_terms, (term, rowid))
+
+    def update_fields(self, rowid, fields):
+        """Apply a partial update to an indexed medicine; unknown ROWIDs are left to the next rebuild."""
+        doc = self._docs.get(_as_int(rowid, None))
+        if doc is not None:
+            self.upsert(dict(doc, **{k: v for k, v in fields.items() if k in doc}))
+
+    def remove(self, rowid):
+        rowid = _as_int(rowid, None)
+        doc = self._docs.pop(rowid, None)
+        if doc is None:
+            return
+        names, others = self._doc_terms(doc)
+        for terms, doc_terms in ((self._name_terms, names), (self._other_terms, others)):
+            for term in doc_terms:
+                i = bisect.bisect_left(terms, (term, rowid))
+                if i < len(terms) and terms[i] == (term, rowid):
+                    del terms[i]
+
+    def suggest(self, prefix, limit):
+        prefix = prefix.casefold()
+        seen = set()
+        suggestions = []
+        for terms in (self._name_terms, self._other_terms):
+            i = bisect.bisect_left(terms, (prefix,))
+            while i < len(terms) and len(suggestions) < limit:
+                term, rowid = terms[i]
+                if not term.startswith(prefix):
+                    break
+                if rowid not in seen:
+                    seen.add(rowid)
+                    suggestions.append(dict(self._docs[rowid]))
+                i += 1
+        return suggestions
+
+
+_MEDICINE_SUGGEST_COLUMNS = 'ROWID, UUID, Name, Dosage, Category, ManufacturerName'
+_medicine_suggest_index = _MedicineSuggestIndex()
+_medicine_suggest_lock = threading.Lock()
+# Held by the one request rebuilding the index; the MedicineStock scan runs under it, not _medicine_suggest_lock
+_medicine_suggest_build_lock = threading.Lock()
+_medicine_suggest_pending = None  # writes made during a rebuild, replayed onto the new index; None otherwise
+
+
+def _apply_medicine_suggest_write(index, upsert=None, rowid=None, fields=None, remove=None):
+    if upsert is not None:
+        index.upsert(upsert)
+    if rowid is not None and fields:
+        index.update_fields(rowid, fields)
+    if remove is not None:
+        index.remove(remove)
+
+
+def _update_medicine_suggest_index(upsert=None, rowid=None, fields=None, remove=None):
+    """Apply a MedicineStock write to the suggest index, if it has been built, and queue it for a rebuild in progress."""
+    with _medicine_suggest_lock:
+        if _medicine_suggest_pending is not None:
+            _medicine_suggest_pending.append((upsert, rowid, fields, remove))
+        if _medicine_suggest_index.built_at is not None:
+            _apply_medicine_suggest_write(_medicine_suggest_index, upsert, rowid, fields, remove)
+
+
+def _medicine_suggest_index_is_fresh(index):
+    return index.built_at is not None and time.monotonic() - index.built_at < _MEDICINE_SUGGEST_TTL_SECONDS
+
+
+def _current_medicine_suggest_index(app):
+    """Return the suggest index, (re)building it when it is missing or older than the TTL.
+
+    Rebuilt like the patient search index (see _current_patient_search_index): the scan fills a
+    new index outside _medicine_suggest_lock, writes made meanwhile are replayed onto it before
+    the swap, and other requests keep using the stale index until then.
+    """
+    global _medicine_suggest_index, _medicine_suggest_pending
+    index = _medicine_suggest_index
+    if _medicine_suggest_index_is_fresh(index):
+        return index
+    if not _medicine_suggest_build_lock.acquire(blocking=index.built_at is None):
+        return index
+    try:
+        index = _medicine_suggest_index
+        if _medicine_suggest_index_is_fresh(index):
+            return index
+        with _medicine_suggest_lock:
+            _medicine_suggest_pending = []
+        try:
+            rebuilt = _MedicineSuggestIndex()
+            rebuilt.build(_zcql_scan(app.zcql(), 'MedicineStock', _MEDICINE_SUGGEST_COLUMNS))
+            with _medicine_suggest_lock:
+                for write in _medicine_suggest_pending:
+                    _apply_medicine_suggest_write(rebuilt, *write)
+                _medicine_suggest_index = rebuilt
+        finally:
+            with _medicine_suggest_lock:
+                _medicine_suggest_pending = None
+        return rebuilt
+    finally:
+        _medicine_suggest_build_lock.release()
+
+
+def _suggest_medicines(request: Request, app):
+    """Type-ahead over MedicineStock names, categories and manufacturers (GET /medicinestock/suggest?q=)."""
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return make_response(jsonify({'status': 'failure', 'error': 'Missing q query parameter'}), 400)
+    try:
+        limit = int(request.args.get('limit') or _MEDICINE_SUGGEST_DEFAULT_LIMIT)
+    except Exception:
+        limit = _MEDICINE_SUGGEST_DEFAULT_LIMIT
+    limit = max(1, min(limit, _MEDICINE_SUGGEST_MAX_LIMIT))
+
+    try:
+        index = _current_medicine_suggest_index(app)
+        with _medicine_suggest_lock:
+            suggestions = index.suggest(query, limit)
+        return make_response(jsonify({'status': 'success', 'data': {'suggestions': suggestions}}), 200)
+    except Exception:
+        logger.exception('Failed to suggest medicines')
+        return make_response(jsonify({'status': 'failure', 'error': 'Failed to suggest medicines'}), 500)
+
+
+# Tables exposed by /export/<table>: (table, SELECT columns, [(output field, source column)]).
+# Field names match what the corresponding list endpoint returns.
+_EXPORT_TABLES = {
+    'patient': ('Patient', _PATIENT_LIST_COLUMNS, [
+        ('id', 'ROWID'), ('Name', 'Name'), ('Gender', 'Gender'), ('Age', 'Age'), ('Profession', 'Profession'),
+        ('Weight', 'Weight'), ('Height', 'Height'), ('Phonenumber', 'Phonenumber'), ('MedicialHistory', 'MedicialHistory'),
+        ('UUID', 'UUID'), ('AdharNumber', 'AdharNumber'), ('Address', 'Address')
+    ]),
+    'prescription': ('Prescription', _PRESCRIPTION_LIST_COLUMNS, [
+        ('ROWID', 'ROWID'), ('UUID', 'UUID'), ('PatientUUID', 'PatientUUID'), ('OutsideMedicines', 'OutsideMedicines'),
+        ('CurrentSymptoms', 'CurrentSymptoms'), ('fees', 'fees'), ('CREATEDTIME', 'CREATEDTIME')
+    ]),
+    'prescribedmedicine': ('PrescribedMedicine', 'ROWID, PrescriptionUUID, MedicineName, frequency, Duration, timing, CREATEDTIME', [
+        ('ROWID', 'ROWID'), ('PrescriptionUUID', 'PrescriptionUUID'), ('MedicineName', 'MedicineName'),
+        ('frequency', 'frequency'), ('Duration', 'Duration'), ('timing', 'timing'), ('CREATEDTIME', 'CREATEDTIME')
+    ]),
+    'medicinestock': ('MedicineStock', 'ROWID, Name, Dosage, Quantity, Category, Price, ManufacturerName, UUID, LedgerRowId', [
+        ('medicineId', 'ROWID'), ('UUID', 'UUID'), ('Name', 'Name'), ('Dosage', 'Dosage'), ('Quantity', 'Quantity'),
+        ('Category', 'Category'), ('Price', 'Price'), ('ManufacturerName', 'ManufacturerName')
+    ]),
+}
+
+
+def _export_pages(zcql, export_key):
+    """Yield lists of export records, one ZCQL page at a time."""
+    table_name, columns, fields = _EXPORT_TABLES[export_key]
+    rows = _zcql_scan(zcql, table_name, columns)
+    while True:
+        page = list(itertools.islice(rows, _ZCQL_MAX_ROWS))
+        if not page:
+            return
+        if table_name == 'MedicineStock':
+            # Quantity is the snapshot plus movements appended to the stock ledger since
+            balances = _fetch_stock_balances(zcql, page)
+            for row in page:
+                row['Quantity'] = balances.get(str(row.get('ROWID')), row.get('Quantity'))
+        yield [{field: row.get(column) for field, column in fields} for row in page]
+
+
+def _export_ndjson(pages):
+    for records in pages:
+        yield ''.join(json.dumps(record, default=str) + '\n' for record in records)
+
+
+def _export_csv(pages, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([field for field, _ in fields])
+    for records in pages:
+        for record in records:
+            writer.writerow(['' if record[field] is None else record[field] for field, _ in fields])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _gzip_chunks(chunks):
+    """Compress a stream of text chunks into a gzip stream without buffering it whole."""
+    compressor = zlib.compressobj(_EXPORT_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _export_table(request: Request, app, table):
+    """Stream a whole table as NDJSON or CSV (GET /export/<table>?format=ndjson|csv)."""
+    export_key = str(table).lower()
+    if export_key not in _EXPORT_TABLES:
+        return make_response(jsonify({'status': 'failure', 'error': f'Unknown export table: {table}'}), 404)
+    export_format = (request.args.get('format') or 'ndjson').lower()
+    if export_format not in ('ndjson', 'csv'):
+        return make_response(jsonify({'status': 'failure', 'error': 'format must be ndjson or csv'}), 400)
+
+    zcql = app.zcql()
+    table_name, _, fields = _EXPORT_TABLES[export_key]
+
+    def generate():
+        pages = _export_pages(zcql, export_key)
+        chunks = _export_csv(pages, fields) if export_format == 'csv' else _export_ndjson(pages)
+        try:
+            yield from chunks
+        except Exception:
+            # Headers are already sent as a 200; NDJSON ends with a failure record the client can
+            # check for, while a CSV body just ends early
+            logger.exception('Failed to export %s', table_name)
+            if export_format == 'ndjson':
+                yield json.dumps({'status': 'failure', 'error': 'Export failed; the output is incomplete'}) + '\n'
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    body = generate()
+    # Vary on every export, so a shared cache never hands a gzip body to an identity client or back
+    headers = {'Content-Disposition': f'attachment; filename="{export_key}.{export_format}"', 'Vary': 'Accept-Encoding'}
+    if request.accept_encodings.best_match(('gzip',)) == 'gzip':
+        body = _gzip_chunks(body)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(body, mimetype=mimetype, headers=headers)
+
+
+def _encode_sync_token(modified, rowid, tombstone_rowid, movement_rowid):
+    """Encode a /sync watermark into an opaque, URL-safe token."""
+    raw = json.dumps([modified, int(rowid), int(tombstone_rowid), int(movement_rowid)], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_sync_token(token):
+    """Decode a /sync token into (MODIFIEDTIME, ROWID, DeletedRecord ROWID, StockMovement ROWID).
+    Raises ValueError if malformed."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        modified, rowid, tombstone_rowid, movement_rowid = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise ValueError(f'Invalid sync token: {token}')
+    if not isinstance(modified, str) or not all(isinstance(v, int) for v in (rowid, tombstone_rowid, movement_rowid)):
+        raise ValueError(f'Invalid sync token: {token}')
+    return modified, rowid, tombstone_rowid, movement_rowid
+
+
+def _latest_rowid(zcql, table_name):
+    """Highest ROWID currently in ``table_name``, or 0 when it is empty."""
+    rows = zcql.execute_query(f"SELECT ROWID FROM {table_name} ORDER BY ROWID DESC LIMIT 0,1") or []
+    return _as_int(_unwrap_row(rows[0], table_name).get('ROWID')) if rows else 0
+
+
+def _record_deletions(app, table_name, rows):
+    """Write DeletedRecord tombstones for rows just deleted from ``table_name``, so /sync
+    clients can drop them from their replicas. ``rows`` are (ROWID, UUID) pairs. A failed
+    write is logged rather than raised, since the rows themselves are already gone."""
+    tombstones = [
+        {'TableName': table_name, 'RecordRowId': _as_int(rowid), 'RecordUUID': record_uuid or ''}
+        for rowid, record_uuid in rows if rowid
+    ]
+    if not tombstones:
+        return
+    try:
+        tombstone_table = app.datastore().table('DeletedRecord')
+        for chunk in _chunked(tombstones, _DATASTORE_BATCH_SIZE):
+            tombstone_table.insert_rows(chunk)
+    except Exception:
+        logger.exception('Failed to record %s deletions from %s', len(tombstones), table_name)
+
+
+def _sync_table(request: Request, app, table):
+    """Rows of a table changed since a sync token, plus tombstones (GET /sync/<table>?since=<token>).
+
+    Rows are read in (MODIFIEDTIME, ROWID) order past the token's watermark. Deletes come from
+    DeletedRecord, and for MedicineStock the rows whose balance moved in the stock ledger are
+    sent too. Without ``since`` the whole table is returned as the initial snapshot.
+    """
+    sync_key = str(table).lower()
+    if sync_key not in _EXPORT_TABLES:
+        return make_response(jsonify({'status': 'failure', 'error': f'Unknown sync table: {table}'}), 404)
+    try:
+        per_page = int(request.args.get('perPage') or _SYNC_DEFAULT_PAGE_SIZE)
+    except Exception:
+        per_page = _SYNC_DEFAULT_PAGE_SIZE
+    per_page = max(1, min(per_page, _ZCQL_MAX_ROWS - 1))
+    since = request.args.get('since')
+    try:
+        watermark = _decode_sync_token(since) if since else None
+    except ValueError:
+        return make_response(jsonify({'status': 'failure', 'error': 'Invalid sync token'}), 400)
+
+    table_name, columns, fields = _EXPORT_TABLES[sync_key]
+    try:
+        zcql = app.zcql()
+        if watermark is None:
+            # Initial snapshot: deletes and ledger movements written before it are already
+            # reflected in the rows, so only later ones need to be sent
+            modified, last_rowid = '', 0
+            tombstone_rowid = _latest_rowid(zcql, 'DeletedRecord')
+            movement_rowid = _latest_rowid(zcql, 'StockMovement') if table_name == 'MedicineStock' else 0
+        else:
+            modified, last_rowid, tombstone_rowid, movement_rowid = watermark
+
+        query = f"SELECT {columns}, MODIFIEDTIME FROM {table_name}"
+        if modified:
+            safe_modified = modified.replace("'", "\\'")
+            query += f" WHERE MODIFIEDTIME > '{safe_modified}' OR (MODIFIEDTIME = '{safe_modified}' AND ROWID > {last_rowid})"
+        result = zcql.execute_query(f"{query} ORDER BY MODIFIEDTIME ASC, ROWID ASC LIMIT 0,{per_page + 1}") or []
+        rows = [_unwrap_row(item, table_name) for item in result]
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if rows:
+            modified, last_rowid = str(rows[-1].get('MODIFIEDTIME')), _as_int(rows[-1].get('ROWID'))
+
+        if table_name == 'MedicineStock':
+            # Stock changes are appended to the ledger without touching MedicineStock, so
+            # medicines with movements since the last sync are sent as well
+            result = zcql.execute_query(
+                f"SELECT ROWID, StockRowId FROM StockMovement WHERE ROWID > {movement_rowid} "
+                f"ORDER BY ROWID ASC LIMIT 0,{per_page + 1}"
+            ) or []
+            movements = [_unwrap_row(item, 'StockMovement') for item in result]
+            has_more = has_more or len(movements) > per_page
+            movements = movements[:per_page]
+            if movements:
+                movement_rowid = _as_int(movements[-1].get('ROWID'))
+            sent = {str(row.get('ROWID')) for row in rows}
+            moved = [rid for rid in dict.fromkeys(str(m.get('StockRowId')) for m in movements) if rid not in sent]
+            for chunk in _chunked(moved, _ZCQL_IN_CHUNK_SIZE):
+                result = zcql.execute_query(f"SELECT {columns} FROM MedicineStock WHERE ROWID IN ({_zcql_in_list(chunk)})") or []
+                rows.extend(_unwrap_row(item, table_name) for item in result)
+            balances = _fetch_stock_balances(zcql, rows)
+            for row in rows:
+                row['Quantity'] = balances.get(str(row.get('ROWID')), row.get('Quantity'))
+
+        safe_table = table_name.replace("'", "\\'")
+        result = zcql.execute_query(
+            f"SELECT ROWID, RecordRowId, RecordUUID FROM DeletedRecord WHERE TableName = '{safe_table}' "
+            f"AND ROWID > {tombstone_rowid} ORDER BY ROWID ASC LIMIT 0,{per_page + 1}"
+        ) or []
+        tombstones = [_unwrap_row(item, 'DeletedRecord') for item in result]
+        has_more = has_more or len(tombstones) > per_page
+        tombstones = tombstones[:per_page]
+        if tombstones:
+            tombstone_rowid = _as_int(tombstones[-1].get('ROWID'))
+
+        resp = {
+            'status': 'success',
+            'data': {
+                'rows': [{field: row.get(column) for field, column in fields} for row in rows],
+                'deleted': [{'ROWID': str(t.get('RecordRowId')), 'UUID': t.get('RecordUUID') or None} for t in tombstones],
+                'hasMore': has_more,
+                'nextToken': _encode_sync_token(modified, last_rowid, tombstone_rowid, movement_rowid)
+            }
+        }
+        return make_response(jsonify(resp), 200)
+    except Exception:
+        logger.exception('Failed to sync %s', table_name)
+        return make_response(jsonify({'status': 'failure', 'error': f'Failed to sync {sync_key}'}), 500)
+
+
+class _QueryTrace:
+    """Datastore calls made while handling one request, for Server-Timing, X-Query-Count and
+    the request log line. Calls may come from helper threads; list.append keeps it safe."""
+
+    def __init__(self):
+        self.calls = []  # [(service, operation, table, duration ms, query, failed)]
+
+    def record(self, service, operation, table_name, started, query=None, failed=False):
+        self.calls.append((service, operation, table_name, (time.perf_counter() - started) * 1000, query, failed))
+
+    def totals(self):
+        """{service: (call count, summed duration ms)} and a Counter of calls per table."""
+        totals = {'zcql': (0, 0.0), 'datastore': (0, 0.0)}
+        tables = Counter()
+        for service, _, table_name, duration, _, _ in list(self.calls):
+            count, total = totals.get(service, (0, 0.0))
+            totals[service] = (count + 1, total + duration)
+            tables[table_name] += 1
+        return totals, tables
+
+
+class _TracedZcql:
+    """ZCQL service that records every execute_query in a _QueryTrace."""
+
+    def __init__(self, zcql, trace):
+        self._zcql = zcql
+        self._trace = trace
+
+    def execute_query(self, query):
+        started = time.perf_counter()
+        match = _ZCQL_TABLE_PATTERN.search(query)
+        table_name = match.group(1) if match else None
+        try:
+            result = self._zcql.execute_query(query)
+        except Exception:
+            self._trace.record('zcql', 'execute_query', table_name, started, query, failed=True)
+            raise
+        self._trace.record('zcql', 'execute_query', table_name, started, query)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._zcql, name)
+
+
+class _TracedTable:
+    """Datastore Table that records its row reads and writes in a _QueryTrace."""
+
+    def __init__(self, table, table_name, trace):
+        self._table = table
+        self._table_name = table_name
+        self._trace = trace
+
+    def __getattr__(self, name):
+        attr = getattr(self._table, name)
+        if name not in _TRACED_TABLE_METHODS:
+            return attr
+
+        def traced(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception:
+                self._trace.record('datastore', name, self._table_name, started, failed=True)
+                raise
+            self._trace.record('datastore', name, self._table_name, started)
+            return result
+        return traced
+
+
+class _RequestDatastore:
+    """Datastore handle that hands out one traced Table object per table name for a request."""
+
+    def __init__(self, datastore, trace):
+        self._datastore = datastore
+        self._trace = trace
+        self._tables = {}
+
+    def table(self, table_name):
+        if table_name not in self._tables:
+            self._tables[table_name] = _TracedTable(self._datastore.table(table_name), table_name, self._trace)
+        return self._tables[table_name]
+
+    def __getattr__(self, name):
+        return getattr(self._datastore, name)
+
+
+class _RequestApp:
+    """Request-scoped view of a CatalystApp that memoizes its ZCQL and datastore handles
+    and the row loaders shared by everything handling the request. Both handles record
+    their calls in ``trace``."""
+
+    def __init__(self, app):
+        self._app = app
+        self._zcql = None
+        self._datastore = None
+        self._loaders = {}
+        self.trace = _QueryTrace()
+
+    def zcql(self):
+        if self._zcql is None:
+            self._zcql = _TracedZcql(self._app.zcql(), self.trace)
+        return self._zcql
+
+    def datastore(self):
+        if self._datastore is None:
+            self._datastore = _RequestDatastore(self._app.datastore(), self.trace)
+        return self._datastore
+
+    def loader(self, table_name, key_column, columns='*'):
+        """The request's _RowLoader for ``table_name`` rows looked up by ``key_column``."""
+        loader_key = (table_name, key_column, columns)
+        if loader_key not in self._loaders:
+            self._loaders[loader_key] = _RowLoader(self.zcql(), table_name, key_column, columns)
+        return self._loaders[loader_key]
+
+    def __getattr__(self, name):
+        return getattr(self._app, name)
+
+
+def _credentials_cache_key(request: Request):
+    """Digest of the Catalyst credential headers of a request, or None if it carries none."""
+    values = [request.headers.get(header, '') for header in _CREDENTIAL_HEADERS]
+    if not any(values):
+        return None
+    return hashlib.sha256('\x1f'.join(values).encode('utf-8')).hexdigest()
+
+
+def _get_catalyst_app(request: Request):
+    """Return a request-scoped app, reusing the Catalyst app initialized by an earlier
+    invocation of this warm container with the same credentials."""
+    key = _credentials_cache_key(request)
+    now = time.monotonic()
+    if key is not None:
+        with _app_cache_lock:
+            cached = _app_cache.get(key)
+            if cached and now - cached[1] < _APP_CACHE_TTL_SECONDS:
+                _app_cache.move_to_end(key)
+                return _RequestApp(cached[0])
+
+    app = zcatalyst_sdk.initialize()
+    if key is not None:
+        with _app_cache_lock:
+            _app_cache[key] = (app, now)
+            _app_cache.move_to_end(key)
+            while len(_app_cache) > _APP_CACHE_MAX_ENTRIES:
+                _app_cache.popitem(last=False)
+    return _RequestApp(app)
+
+
+def _get_metrics(request: Request, app):
+    """Expose in-process counters of this warm instance."""
+    return make_response(jsonify({'status': 'success', 'data': {
+        'stockLedger': _get_stock_ledger_stats(),
+        'stockCatalog': _get_stock_catalog_stats()
+    }}), 200)
+
+
 def generate_uuid():
     """Generate and return a new UUID string."""
     return str(uuid.uuid4())
@@ -1526,10 +3485,184 @@ def check_authentication(request: Request, app):
         return False, error_response
 
 
+# Path parameter converters: '<name>' matches any single segment, '<rowid:name>' only digits.
+# ROWIDs are passed on as strings since they exceed the integer range JSON clients handle safely.
+_ROUTE_CONVERTERS = {
+    'str': lambda segment: segment,
+    'rowid': lambda segment: segment if segment.isdigit() else None,
+}
+
+# (method, path pattern, handler); handlers receive path parameters positionally after (request, app)
+_ROUTE_SPECS = (
+    # Patient endpoints
+    ('POST', '/add', _create_patient),
+    ('GET', '/all', _list_patients),
+    ('GET', '/patient', _get_patient_by_phone),
+    ('GET', '/patient/search', _search_patients),
+    ('POST', '/patient/import', _import_patients),
+    ('POST', '/patient/batch', _get_patients_batch),
+    ('DELETE', '/patient', _delete_patient),
+    ('PUT', '/patient', _update_patient),
+
+    # Prescription endpoints (UUID-based)
+    ('POST', '/prescription/add', _create_prescription),
+    ('POST', '/prescription/save', _save_prescription_atomic),
+    ('GET', '/prescription/all', _list_prescriptions),
+    ('POST', '/prescription/batch', _get_prescriptions_batch),
+    ('GET', '/prescription/get/<uuid>', _get_prescription_by_uuid),
+    ('PUT', '/prescription/update/<uuid>', _update_prescription),
+    ('DELETE', '/prescription/delete/<uuid>', _delete_prescription),
+
+    # PrescribedMedicine endpoints
+    ('POST', '/prescribedmedicine/add', _create_prescribed_medicine),
+    ('GET', '/prescribedmedicine/all/<prescription_uuid>', _get_prescribed_medicines_by_prescription),
+    ('GET', '/prescribedmedicine/get/<rowid:rowid>', _get_prescribed_medicine_by_rowid),
+    ('PUT', '/prescribedmedicine/update/<rowid:rowid>', _update_prescribed_medicine),
+    ('DELETE', '/prescribedmedicine/delete/<rowid:rowid>', _delete_prescribed_medicine),
+
+    # Patient prescription history endpoint
+    ('GET', '/prescription/patient/<patient_uuid>', _get_prescriptions_by_patient),
+    ('GET', '/patient/<patient_uuid>/chart', _get_patient_chart),
+
+    # MedicineStock endpoints
+    ('POST', '/medicinestock/add', _create_medicine),
+    ('GET', '/medicinestock/all', _list_medicines),
+    ('GET', '/medicinestock/suggest', _suggest_medicines),
+    ('GET', '/medicinestock', _get_medicine_by_name),
+    ('DELETE', '/medicinestock', _delete_medicine),
+    ('PUT', '/medicinestock', _update_medicine),
+
+    # Dashboards
+    ('GET', '/insights/patients', _get_patient_insights),
+
+    # Delta sync
+    ('GET', '/sync/<table>', _sync_table),
+
+    # Bulk export
+    ('GET', '/export/<table>', _export_table),
+
+    # Instance metrics
+    ('GET', '/metrics', _get_metrics),
+)
+
+
+class _RouteNode:
+    """One path segment of the compiled route tree."""
+    __slots__ = ('static', 'params', 'handlers')
+
+    def __init__(self):
+        self.static = {}    # {segment: _RouteNode}
+        self.params = []    # [(converter, _RouteNode)], tried after static children
+        self.handlers = {}  # {method: handler}
+
+
+def _compile_routes(specs):
+    """Build the exact-path lookup and the parameterized route tree from (method, pattern, handler) specs."""
+    exact = {}  # {path: {method: handler}}
+    root = _RouteNode()
+    for method, pattern, route_handler in specs:
+        segments = pattern.strip('/').split('/')
+        if not any(segment.startswith('<') for segment in segments):
+            exact.setdefault(pattern, {})[method] = route_handler
+            continue
+        node = root
+        for segment in segments:
+            if segment.startswith('<') and segment.endswith('>'):
+                kind, _, _name = segment[1:-1].rpartition(':')
+                converter = _ROUTE_CONVERTERS[kind or 'str']
+                child = next((n for c, n in node.params if c is converter), None)
+                if child is None:
+                    child = _RouteNode()
+                    node.params.append((converter, child))
+                node = child
+            else:
+                node = node.static.setdefault(segment, _RouteNode())
+        if method in node.handlers:
+            raise ValueError(f"Duplicate route: {method} {pattern}")
+        node.handlers[method] = route_handler
+    return exact, root
+
+
+def _match_route_tree(node, segments, index, params):
+    """Depth-first match of path segments; returns (handlers_by_method, params) or None."""
+    if index == len(segments):
+        return (node.handlers, params) if node.handlers else None
+    segment = segments[index]
+    child = node.static.get(segment)
+    if child is not None:
+        found = _match_route_tree(child, segments, index + 1, params)
+        if found:
+            return found
+    for converter, child in node.params:
+        value = converter(segment) if segment else None
+        if value is None:
+            continue
+        found = _match_route_tree(child, segments, index + 1, params + [value])
+        if found:
+            return found
+    return None
+
+
+def _resolve_route(method, path):
+    """Returns (handler, params, allowed_methods); handler is None when nothing matches the method."""
+    if len(path) > 1:
+        path = path.rstrip('/') or '/'
+    handlers = _EXACT_ROUTES.get(path)
+    params = []
+    if handlers is None:
+        found = _match_route_tree(_ROUTE_TREE, path.strip('/').split('/'), 0, [])
+        if found is None:
+            return None, None, ()
+        handlers, params = found
+    return handlers.get(method), params, tuple(handlers)
+
+
+_EXACT_ROUTES, _ROUTE_TREE = _compile_routes(_ROUTE_SPECS)
+
+
+def _finish_request(request: Request, app, response, started):
+    """Add Server-Timing and X-Query-Count to ``response`` and write the request's structured
+    log line. For streamed responses only the work done before streaming began is counted."""
+    try:
+        total_ms = (time.perf_counter() - started) * 1000
+        trace = app.trace if app is not None else _QueryTrace()
+        totals, tables = trace.totals()
+        zcql_count, zcql_ms = totals['zcql']
+        datastore_count, datastore_ms = totals['datastore']
+        response.headers['Server-Timing'] = (
+            f'zcql;dur={zcql_ms:.1f};desc="{zcql_count} queries", '
+            f'datastore;dur={datastore_ms:.1f};desc="{datastore_count} calls", '
+            f'total;dur={total_ms:.1f}'
+        )
+        response.headers['X-Query-Count'] = str(zcql_count + datastore_count)
+        entry = {
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'durationMs': round(total_ms, 1),
+            'queries': zcql_count,
+            'queryMs': round(zcql_ms, 1),
+            'datastoreCalls': datastore_count,
+            'datastoreMs': round(datastore_ms, 1),
+            'tables': dict(tables)
+        }
+        if _QUERY_TRACE_DEBUG:
+            entry['trace'] = [
+                {'service': service, 'operation': operation, 'table': table_name, 'ms': round(duration, 2), 'query': query, 'failed': failed}
+                for service, operation, table_name, duration, query, failed in trace.calls
+            ]
+        logger.info(json.dumps(entry, default=str))
+    except Exception:
+        logger.exception('Failed to record request metrics')
+    return response
+
+
 def handler(request: Request):
+    started = time.perf_counter()
+    app = None
     try:
-        app = zcatalyst_sdk.initialize()
-        logger = logging.getLogger()
+        app = _get_catalyst_app(request)
         
         # Authentication temporarily disabled - uncomment when Hosted Login is fully configured
         # Check authentication for all endpoints
@@ -1537,72 +3670,18 @@ def handler(request: Request):
         # if not is_authenticated:
         #     return auth_error
         
-        # Patient endpoints
-        if request.path == "/add" and request.method == 'POST':
-            return _create_patient(request, app)
-        if request.path == "/all" and request.method == 'GET':
-            return _list_patients(request, app)
-        if request.path == "/patient" and request.method == 'GET':
-            return _get_patient_by_phone(request, app)
-        if request.method == 'DELETE' and request.path.startswith('/patient'):
-            return _delete_patient(request, app)
-        if request.path == "/patient" and request.method == 'PUT':
-            return _update_patient(request, app)
-
-        # Prescription endpoints (UUID-based)
-        if request.path == "/prescription/add" and request.method == 'POST':
-            return _create_prescription(request, app)
-        if request.path == "/prescription/save" and request.method == 'POST':
-            return _save_prescription_atomic(request, app)
-        if request.path == "/prescription/all" and request.method == 'GET':
-            return _list_prescriptions(request, app)
-        if request.path.startswith("/prescription/get/") and request.method == 'GET':
-            uuid = request.path.split("/prescription/get/")[1]
-            return _get_prescription_by_uuid(request, app, uuid)
-        if request.path.startswith("/prescription/update/") and request.method == 'PUT':
-            uuid = request.path.split("/prescription/update/")[1]
-            return _update_prescription(request, app, uuid)
-        if request.path.startswith("/prescription/delete/") and request.method == 'DELETE':
-            uuid = request.path.split("/prescription/delete/")[1]
-            return _delete_prescription(request, app, uuid)
-        
-        # PrescribedMedicine endpoints
-        if request.path == "/prescribedmedicine/add" and request.method == 'POST':
-            return _create_prescribed_medicine(request, app)
-        if request.path.startswith("/prescribedmedicine/all/") and request.method == 'GET':
-            prescription_uuid = request.path.split("/prescribedmedicine/all/")[1]
-            return _get_prescribed_medicines_by_prescription(request, app, prescription_uuid)
-        if request.path.startswith("/prescribedmedicine/get/") and request.method == 'GET':
-            rowid = request.path.split("/prescribedmedicine/get/")[1]
-            return _get_prescribed_medicine_by_rowid(request, app, rowid)
-        if request.path.startswith("/prescribedmedicine/update/") and request.method == 'PUT':
-            rowid = request.path.split("/prescribedmedicine/update/")[1]
-            return _update_prescribed_medicine(request, app, rowid)
-        if request.path.startswith("/prescribedmedicine/delete/") and request.method == 'DELETE':
-            rowid = request.path.split("/prescribedmedicine/delete/")[1]
-            return _delete_prescribed_medicine(request, app, rowid)
-        
-        # Patient prescription history endpoint
-        if request.path.startswith("/prescription/patient/") and request.method == 'GET':
-            patient_uuid = request.path.split("/prescription/patient/")[1]
-            return _get_prescriptions_by_patient(request, app, patient_uuid)
-        
-        # MedicineStock endpoints
-        if request.path == "/medicinestock/add" and request.method == 'POST':
-            return _create_medicine(request, app)
-        if request.path == "/medicinestock/all" and request.method == 'GET':
-            return _list_medicines(request, app)
-        if request.path == "/medicinestock" and request.method == 'GET':
-            return _get_medicine_by_name(request, app)
-        if request.path == "/medicinestock" and request.method == 'DELETE':
-            return _delete_medicine(request, app)
-        if request.path == "/medicinestock" and request.method == 'PUT':
-            return _update_medicine(request, app)
-        
-        print('working')
+        route_handler, params, allowed_methods = _resolve_route(request.method, request.path)
+        if route_handler is not None:
+            response = _make_conditional(request, route_handler(request, app, *params))
+            response = _compress_response(request, response)
+        elif allowed_methods:
+            response = make_response(jsonify({'status': 'failure', 'error': 'Method not allowed'}), 405)
+            response.headers['Allow'] = ', '.join(allowed_methods)
+        else:
+            response = make_response(jsonify({'status': 'failure', 'error': 'Not found'}), 404)
     except Exception as err:
         logger.error(f"Exception in to_do_list_function :{err}")
         response = make_response(jsonify({
                  "error": "Internal server error occurred. Please try again in some time."
         }), 500)
-        return response
\ No newline at end of file
+    return _finish_request(request, app, response, started)
\ No newline at end of file
@@ -0,0 +1,11 @@
+import pytest
+
+import main
+from tests.fake_catalyst import FakeCatalyst
+
+
+@pytest.fixture
+def catalyst(monkeypatch):
+    """A fresh fake Catalyst project wired into main.handler."""
+    monkeypatch.setattr(main.zcatalyst_sdk, 'initialize', main.zcatalyst_sdk.initialize)
+    return FakeCatalyst().install()
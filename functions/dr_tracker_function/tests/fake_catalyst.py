@@ -0,0 +1,214 @@
+"""In-memory stand-in for the Catalyst ZCQL and datastore services, for tests and benchmarks.
+
+ZCQL is run by SQLite, which understands the subset main.py issues (SELECT with IN, ORDER BY
+and ``LIMIT offset,count``, and the compare-and-swap UPDATEs of the stock ledger). As with
+ZCQL, rows come back wrapped as ``{'<Table>': {...}}`` and a SELECT returns at most 300 rows.
+Every call is recorded in ``FakeDatabase.calls``; ``latency`` adds a sleep per call to stand
+in for the network round trip.
+"""
+import re
+import sqlite3
+import threading
+import time
+
+from flask import Flask, request as flask_request
+
+import main
+
+SCHEMA = {
+    'Patient': ['Name', 'Gender', 'Age', 'Profession', 'Weight', 'Height', 'Phonenumber', 'MedicialHistory', 'UUID', 'AdharNumber', 'Address'],
+    'Prescription': ['UUID', 'PatientUUID', 'OutsideMedicines', 'CurrentSymptoms', 'fees'],
+    'PrescribedMedicine': ['PrescriptionUUID', 'MedicineName', 'frequency', 'Duration', 'timing'],
+    'MedicineStock': ['Name', 'Dosage', 'Quantity', 'Category', 'Price', 'ManufacturerName', 'UUID', 'LedgerRowId', 'OpeningQuantity'],
+    'StockMovement': ['StockRowId', 'MedicineName', 'Delta', 'Reason', 'PrescriptionUUID'],
+    'DeletedRecord': ['TableName', 'RecordUUID', 'RecordRowId'],
+}
+INTEGER_COLUMNS = {'StockRowId', 'Delta', 'LedgerRowId', 'OpeningQuantity', 'Quantity', 'Age', 'RecordRowId'}
+ZCQL_MAX_ROWS = 300
+
+
+class FakeDatabase:
+    """SQLite database holding the Catalyst tables, shared by every fake service handle."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = []  # [(kind, detail)], kind is 'zcql', 'insert', 'update' or 'delete'
+        self._calls_lock = threading.Lock()
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(':memory:', check_same_thread=False, isolation_level=None)
+        now = "(strftime('%Y-%m-%d %H:%M:%f','now'))"
+        for table_name, columns in SCHEMA.items():
+            column_defs = ', '.join(f'{c} INTEGER' if c in INTEGER_COLUMNS else c for c in columns)
+            self._conn.execute(
+                f"CREATE TABLE {table_name} (ROWID INTEGER PRIMARY KEY AUTOINCREMENT, {column_defs}, "
+                f"CREATEDTIME TEXT DEFAULT {now}, MODIFIEDTIME TEXT DEFAULT {now})"
+            )
+            self._conn.execute(
+                f"CREATE TRIGGER {table_name}_modified AFTER UPDATE ON {table_name} FOR EACH ROW "
+                f"WHEN NEW.MODIFIEDTIME = OLD.MODIFIEDTIME BEGIN "
+                f"UPDATE {table_name} SET MODIFIEDTIME = {now} WHERE ROWID = NEW.ROWID; END"
+            )
+
+    def record(self, kind, detail):
+        with self._calls_lock:
+            self.calls.append((kind, detail))
+        if self.latency:
+            time.sleep(self.latency)
+
+    def ops(self, kind=None):
+        with self._calls_lock:
+            return [call for call in self.calls if kind is None or call[0] == kind]
+
+    def reset_calls(self):
+        with self._calls_lock:
+            self.calls = []
+
+    def query(self, query):
+        self.record('zcql', query)
+        sql = query.replace("\\'", "''")
+        # ZCQL LIKE patterns use * as the wildcard
+        sql = re.sub(r"(LIKE\s+')((?:[^']|'')*)'", lambda m: m.group(1) + m.group(2).replace('*', '%') + "'", sql, flags=re.I)
+        match = re.search(r'\bFROM\s+(\w+)', sql, re.I) or re.search(r'^\s*UPDATE\s+(\w+)', sql, re.I)
+        table_name = match.group(1) if match else None
+        limit = re.search(r'LIMIT\s+(\d+)\s*,\s*(\d+)\s*$', sql, re.I)
+        if limit and int(limit.group(2)) > ZCQL_MAX_ROWS:
+            raise Exception('ZCQL LIMIT too large')
+        if re.match(r'\s*UPDATE', sql, re.I):
+            sql += ' RETURNING *'
+        with self._lock:
+            cursor = self._conn.execute(sql)
+            rows = cursor.fetchall()
+            names = [d[0] for d in cursor.description] if cursor.description else []
+        if not limit and re.match(r'\s*SELECT', sql, re.I):
+            rows = rows[:ZCQL_MAX_ROWS]
+        return [{table_name: dict(zip(names, row))} for row in rows]
+
+    def insert(self, table_name, rows):
+        """Insert rows directly, without recording a call. Returns them with their ROWIDs."""
+        inserted = []
+        with self._lock:
+            for row in rows:
+                columns = list(row)
+                cursor = self._conn.execute(
+                    f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) RETURNING *",
+                    [row[c] for c in columns]
+                )
+                names = [d[0] for d in cursor.description]
+                inserted.append(dict(zip(names, cursor.fetchone())))
+        return inserted
+
+    def delete(self, table_name, rowids):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {table_name} WHERE ROWID IN ({', '.join(str(int(r)) for r in rowids)})")
+
+    def update(self, table_name, rows):
+        with self._lock:
+            for row in rows:
+                row = dict(row)
+                rowid = row.pop('ROWID')
+                self._conn.execute(
+                    f"UPDATE {table_name} SET {', '.join(f'{k} = ?' for k in row)} WHERE ROWID = ?",
+                    list(row.values()) + [rowid]
+                )
+
+    def select(self, sql):
+        """Run raw SQL without recording a call (for assertions)."""
+        with self._lock:
+            cursor = self._conn.execute(sql)
+            names = [d[0] for d in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+class FakeTable:
+    def __init__(self, db, table_name):
+        self._db = db
+        self._table_name = table_name
+
+    def insert_rows(self, rows):
+        self._db.record('insert', (self._table_name, len(rows)))
+        return self._db.insert(self._table_name, rows)
+
+    def insert_row(self, row):
+        return self.insert_rows([row])[0]
+
+    def update_rows(self, rows):
+        self._db.record('update', (self._table_name, len(rows)))
+        self._db.update(self._table_name, rows)
+        return rows
+
+    def update_row(self, row):
+        return self.update_rows([row])[0]
+
+    def delete_rows(self, rowids):
+        self._db.record('delete', (self._table_name, len(rowids)))
+        self._db.delete(self._table_name, rowids)
+        return True
+
+    def delete_row(self, rowid):
+        return self.delete_rows([rowid])
+
+
+class FakeZcql:
+    def __init__(self, db):
+        self._db = db
+
+    def execute_query(self, query):
+        return self._db.query(query)
+
+
+class FakeDatastore:
+    def __init__(self, db):
+        self._db = db
+
+    def table(self, table_name):
+        return FakeTable(self._db, table_name)
+
+
+class FakeApp:
+    def __init__(self, db):
+        self._zcql = FakeZcql(db)
+        self._datastore = FakeDatastore(db)
+
+    def zcql(self):
+        return self._zcql
+
+    def datastore(self):
+        return self._datastore
+
+
+def reset_main_state():
+    """Drop every in-process cache and index main.py keeps between invocations."""
+    main._app_cache.clear()
+    main._count_cache.clear()
+    main._insights_cache.clear()
+    main._stock_catalog.clear()
+    main._patient_search_index = main._PatientSearchIndex()
+    main._patient_search_pending = None
+    main._medicine_suggest_index = main._MedicineSuggestIndex()
+    main._medicine_suggest_pending = None
+
+
+class FakeCatalyst:
+    """A FakeDatabase wired into main.handler: ``zcatalyst_sdk.initialize`` returns a FakeApp
+    over it, and ``call`` sends a request through the handler."""
+
+    def __init__(self, latency=0.0):
+        self.db = FakeDatabase(latency)
+        self.flask_app = Flask(__name__)
+
+    def install(self):
+        main.zcatalyst_sdk.initialize = lambda *args, **kwargs: FakeApp(self.db)
+        reset_main_state()
+        return self
+
+    def request(self, method, path, json_body=None, query=None, headers=None, data=None, content_type=None):
+        """Send a request through main.handler and return the Flask response. ``data`` and
+        ``content_type`` send a raw body instead of ``json_body``."""
+        with self.flask_app.test_request_context(path, method=method, json=json_body, query_string=query,
+                                                 headers=headers or {}, data=data, content_type=content_type):
+            return main.handler(flask_request)
+
+    def call(self, method, path, json_body=None, query=None, headers=None):
+        """Send a request through main.handler and return (status code, decoded JSON body)."""
+        response = self.request(method, path, json_body, query, headers)
+        return response.status_code, response.get_json()
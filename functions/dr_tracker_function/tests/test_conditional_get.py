@@ -0,0 +1,93 @@
+import main
+
+
+def _seed_history(catalyst, visits=40):
+    catalyst.db.insert('Prescription', [
+        {'UUID': f'rx-{i}', 'PatientUUID': 'p-1', 'CurrentSymptoms': f'Fever for {i} days'} for i in range(visits)
+    ])
+
+
+def test_304_for_a_compressed_response_keeps_its_weak_etag_and_vary(catalyst):
+    _seed_history(catalyst)
+    headers = {'Accept-Encoding': 'gzip'}
+    full = catalyst.request('GET', '/prescription/patient/p-1', headers=headers)
+    assert full.headers['Content-Encoding'] == 'gzip'
+    assert full.headers['ETag'].startswith('W/')
+
+    headers['If-None-Match'] = full.headers['ETag']
+    not_modified = catalyst.request('GET', '/prescription/patient/p-1', headers=headers)
+
+    assert not_modified.status_code == 304
+    assert not_modified.get_data() == b''
+    assert not_modified.headers['ETag'] == full.headers['ETag']
+    assert 'Accept-Encoding' in not_modified.headers['Vary']
+
+
+def test_304_for_an_identity_response_keeps_its_strong_etag(catalyst):
+    # /patient/search tags a hash of its body, which stays strong when sent uncompressed
+    catalyst.db.insert('Patient', [{'Name': f'Ramesh {i}', 'Phonenumber': str(i), 'UUID': f'p-{i}'} for i in range(40)])
+    query = {'q': 'ramesh'}
+    full = catalyst.request('GET', '/patient/search', query=query)
+    assert 'Content-Encoding' not in full.headers
+    assert not full.headers['ETag'].startswith('W/')
+
+    not_modified = catalyst.request('GET', '/patient/search', query=query, headers={'If-None-Match': full.headers['ETag']})
+
+    assert not_modified.status_code == 304
+    assert not_modified.headers['ETag'] == full.headers['ETag']
+    assert 'Accept-Encoding' in not_modified.headers['Vary']
+
+
+def test_list_304_is_answered_before_serializing(catalyst, monkeypatch):
+    _seed_history(catalyst)
+    catalyst.db.insert('PrescribedMedicine', [{'PrescriptionUUID': 'rx-0', 'MedicineName': 'M'}])
+    jsonify = main.jsonify
+    for path in ('/all', '/prescription/all', '/medicinestock/all', '/prescription/patient/p-1'):
+        full = catalyst.request('GET', path)
+        encoded = []
+        monkeypatch.setattr(main, 'jsonify', lambda payload: encoded.append(payload) or jsonify(payload))
+
+        not_modified = catalyst.request('GET', path, headers={'If-None-Match': full.headers['ETag']})
+
+        monkeypatch.setattr(main, 'jsonify', jsonify)
+        assert not_modified.status_code == 304, path
+        assert not_modified.headers['ETag'] == full.headers['ETag'], path
+        assert encoded == [], path
+
+
+def test_list_etag_changes_when_a_row_changes(catalyst):
+    _seed_history(catalyst)
+    before = catalyst.request('GET', '/prescription/patient/p-1').headers['ETag']
+    catalyst.db.update('Prescription', [{'ROWID': 1, 'fees': '700'}])
+    after = catalyst.request('GET', '/prescription/patient/p-1', headers={'If-None-Match': before})
+
+    assert after.status_code == 200
+    assert after.headers['ETag'] != before
+
+
+def test_single_row_304_matches_the_compressed_200(catalyst):
+    catalyst.db.insert('Patient', [{'Name': 'A', 'Phonenumber': '1', 'UUID': 'p-1', 'MedicialHistory': 'x' * 3000}])
+    headers = {'Accept-Encoding': 'gzip'}
+    full = catalyst.request('GET', '/patient', query={'Phonenumber': '1'}, headers=headers)
+    assert full.headers['Content-Encoding'] == 'gzip'
+
+    headers['If-None-Match'] = full.headers['ETag']
+    not_modified = catalyst.request('GET', '/patient', query={'Phonenumber': '1'}, headers=headers)
+
+    assert not_modified.status_code == 304
+    assert not_modified.headers['ETag'] == full.headers['ETag']
+    assert not_modified.headers['Vary'] == full.headers['Vary']
+
+
+def test_single_row_304_matches_the_identity_200(catalyst):
+    catalyst.db.insert('Patient', [{'Name': 'A', 'Phonenumber': '1', 'UUID': 'p-1'}])
+    headers = {'Accept-Encoding': 'gzip'}
+    full = catalyst.request('GET', '/patient', query={'Phonenumber': '1'}, headers=headers)
+    assert 'Content-Encoding' not in full.headers
+
+    headers['If-None-Match'] = full.headers['ETag']
+    not_modified = catalyst.request('GET', '/patient', query={'Phonenumber': '1'}, headers=headers)
+
+    assert not_modified.status_code == 304
+    assert not_modified.headers['ETag'] == full.headers['ETag']
+    assert not_modified.headers['Vary'] == full.headers['Vary']
@@ -0,0 +1,38 @@
+import gzip
+import json
+
+import main
+
+
+def _seed(catalyst, patients=5):
+    catalyst.db.insert('Patient', [{'Name': f'P{i}', 'Phonenumber': str(i), 'UUID': f'u{i}'} for i in range(patients)])
+
+
+def test_gzip_follows_accept_encoding_q_values(catalyst):
+    _seed(catalyst)
+
+    compressed = catalyst.request('GET', '/export/patient', headers={'Accept-Encoding': 'gzip'})
+    refused = catalyst.request('GET', '/export/patient', headers={'Accept-Encoding': 'gzip;q=0, deflate'})
+
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert len(gzip.decompress(compressed.get_data()).splitlines()) == 5
+    assert 'Content-Encoding' not in refused.headers
+    assert compressed.headers['Vary'] == refused.headers['Vary'] == 'Accept-Encoding'
+    assert len(refused.get_data().splitlines()) == 5
+
+
+def test_ndjson_export_failing_mid_stream_ends_with_a_failure_record(catalyst, monkeypatch):
+    _seed(catalyst)
+    export_pages = main._export_pages
+
+    def failing_pages(zcql, export_key):
+        yield next(export_pages(zcql, export_key))
+        raise RuntimeError('datastore went away')
+
+    monkeypatch.setattr(main, '_export_pages', failing_pages)
+    response = catalyst.request('GET', '/export/patient')
+    lines = [json.loads(line) for line in response.get_data().splitlines()]
+
+    assert response.status_code == 200
+    assert len(lines) == 6
+    assert lines[-1]['status'] == 'failure'
@@ -0,0 +1,12 @@
+import main
+
+
+def test_failed_app_initialization_returns_500(catalyst, monkeypatch):
+    def initialize(*args, **kwargs):
+        raise RuntimeError('credentials rejected')
+
+    monkeypatch.setattr(main.zcatalyst_sdk, 'initialize', initialize)
+    status, body = catalyst.call('GET', '/all')
+
+    assert status == 500
+    assert 'error' in body
@@ -0,0 +1,26 @@
+import datetime
+import json
+
+import pytest
+
+import main
+
+PAYLOAD = {
+    'created': datetime.datetime(2024, 1, 2, 3, 4, 5),
+    'day': datetime.date(2024, 1, 2),
+    'weights': [float('nan'), float('inf'), 72.5],
+    'nested': {'b': 1, 'a': ('x', None, True)},
+    'name': 'Zoë',
+}
+
+
+def test_stdlib_encoder_emits_valid_json_for_non_finite_floats():
+    decoded = json.loads(main._encode_json_stdlib(PAYLOAD))
+
+    assert decoded['weights'] == [None, None, 72.5]
+    assert decoded['created'] == '2024-01-02 03:04:05'
+
+
+@pytest.mark.skipif(main.orjson is None, reason='orjson is not installed')
+def test_encoders_emit_the_same_bytes():
+    assert main._encode_json_orjson(PAYLOAD) == main._encode_json_stdlib(PAYLOAD)
@@ -0,0 +1,40 @@
+import threading
+
+import main
+
+
+def test_suggestions_keep_string_rowids(catalyst):
+    catalyst.db.insert('MedicineStock', [{'Name': 'Paracetamol', 'Quantity': 5, 'UUID': 'm-1'}])
+
+    status, body = catalyst.call('GET', '/medicinestock/suggest', query={'q': 'para'})
+
+    assert status == 200, body
+    assert [s['ROWID'] for s in body['data']['suggestions']] == ['1']
+
+
+def test_writes_are_not_blocked_by_a_rebuild_and_are_replayed(catalyst, monkeypatch):
+    catalyst.db.insert('MedicineStock', [
+        {'Name': 'Paracetamol', 'Quantity': 5, 'UUID': 'm-1'},
+        {'Name': 'Ibuprofen', 'Quantity': 5, 'UUID': 'm-2'},
+    ])
+    scan = main._zcql_scan
+    written = threading.Event()
+
+    def scan_then_write(*args, **kwargs):
+        for i, row in enumerate(scan(*args, **kwargs)):
+            if i == 1:
+                # A write from another request lands while the scan is still running
+                writer = threading.Thread(target=main._update_medicine_suggest_index,
+                                          kwargs={'upsert': {'ROWID': '99', 'UUID': 'm-99', 'Name': 'Cetirizine'}})
+                writer.start()
+                writer.join(timeout=5)
+                if not writer.is_alive():
+                    written.set()
+            yield row
+
+    monkeypatch.setattr(main, '_zcql_scan', scan_then_write)
+    _, body = catalyst.call('GET', '/medicinestock/suggest', query={'q': 'para'})
+    assert [s['Name'] for s in body['data']['suggestions']] == ['Paracetamol']
+    assert written.is_set()
+    _, body = catalyst.call('GET', '/medicinestock/suggest', query={'q': 'ceti'})
+    assert [s['Name'] for s in body['data']['suggestions']] == ['Cetirizine']
@@ -0,0 +1,27 @@
+import json
+
+from tests.fake_catalyst import FakeTable
+
+
+def _import(catalyst, records):
+    body = '\n'.join(json.dumps(record) for record in records)
+    response = catalyst.request('POST', '/patient/import', data=body, content_type='application/x-ndjson')
+    return response.status_code, response.get_json()
+
+
+def test_bulk_insert_committed_before_failing_is_not_inserted_twice(catalyst, monkeypatch):
+    insert_rows = FakeTable.insert_rows
+
+    def commit_then_fail(self, rows):
+        insert_rows(self, rows)
+        raise ConnectionError('connection reset after commit')
+
+    monkeypatch.setattr(FakeTable, 'insert_rows', commit_then_fail)
+    status, body = _import(catalyst, [
+        {'Name': f'P{i}', 'Phonenumber': str(i), 'Gender': 'M', 'Age': 30} for i in range(3)
+    ])
+
+    assert status == 200, body
+    assert body['data']['created'] == 3
+    assert all(result['ROWID'] for result in body['data']['results'])
+    assert catalyst.db.select('SELECT COUNT(ROWID) AS n FROM Patient')[0]['n'] == 3
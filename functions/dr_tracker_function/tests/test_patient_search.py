@@ -0,0 +1,57 @@
+import threading
+
+import main
+
+
+def _seed(catalyst):
+    catalyst.db.insert('Patient', [
+        {'Name': 'Ramesh Sharma', 'Phonenumber': '9876543210', 'UUID': 'p-1'},
+        {'Name': 'Priya Nair', 'Phonenumber': '9123456789', 'UUID': 'p-2'},
+    ])
+
+
+def _search(catalyst, q):
+    status, body = catalyst.call('GET', '/patient/search', query={'q': q})
+    assert status == 200, body
+    return [p['Name'] for p in body['data']['patients']]
+
+
+def test_writes_are_not_blocked_by_a_rebuild_and_are_replayed(catalyst, monkeypatch):
+    _seed(catalyst)
+    scan = main._zcql_scan
+    written = threading.Event()
+
+    def scan_then_write(*args, **kwargs):
+        for i, row in enumerate(scan(*args, **kwargs)):
+            if i == 1:
+                # A write from another request lands while the scan is still running
+                writer = threading.Thread(target=main._update_patient_search_index,
+                                          kwargs={'upsert': {'ROWID': '99', 'UUID': 'p-99', 'Name': 'Zubin Khambatta'}})
+                writer.start()
+                writer.join(timeout=5)
+                if not writer.is_alive():
+                    written.set()
+            yield row
+
+    monkeypatch.setattr(main, '_zcql_scan', scan_then_write)
+    assert _search(catalyst, 'ramesh') == ['Ramesh Sharma']
+    assert written.is_set()
+    assert _search(catalyst, 'zubin') == ['Zubin Khambatta']
+
+
+def test_large_tables_are_searched_with_zcql(catalyst, monkeypatch):
+    _seed(catalyst)
+    monkeypatch.setattr(main, '_PATIENT_SEARCH_MAX_INDEXED_ROWS', 1)
+
+    assert _search(catalyst, 'sha') == ['Ramesh Sharma']
+    assert _search(catalyst, '34567') == ['Priya Nair']
+    assert main._patient_search_index.built_at is None
+
+
+def test_results_keep_string_rowids(catalyst):
+    _seed(catalyst)
+
+    _, body = catalyst.call('GET', '/patient/search', query={'q': 'priya'})
+    assert [p['ROWID'] for p in body['data']['patients']] == ['2']
+    fallback = main._query_patient_search(main.zcatalyst_sdk.initialize().zcql(), 'priya', 5)
+    assert [p['ROWID'] for p in fallback] == ['2']
@@ -0,0 +1,26 @@
+import pytest
+
+
+def _seed_patient_with_prescriptions(catalyst, prescription_count, medicines_per_prescription=3):
+    patient = catalyst.db.insert('Patient', [{'Name': 'A', 'Phonenumber': '1', 'UUID': 'p-1'}])[0]
+    prescriptions = [{'UUID': f'rx-{i}', 'PatientUUID': patient['UUID']} for i in range(prescription_count)]
+    catalyst.db.insert('Prescription', prescriptions)
+    catalyst.db.insert('PrescribedMedicine', [
+        {'PrescriptionUUID': p['UUID'], 'MedicineName': f'M{j}', 'frequency': 'Once daily', 'Duration': '3'}
+        for p in prescriptions for j in range(medicines_per_prescription)
+    ])
+    return patient['UUID']
+
+
+@pytest.mark.parametrize('prescription_count', [1, 10, 50])
+def test_patient_history_query_count_does_not_grow_with_prescriptions(catalyst, prescription_count):
+    patient_uuid = _seed_patient_with_prescriptions(catalyst, prescription_count)
+    catalyst.db.reset_calls()
+
+    status, body = catalyst.call('GET', f'/prescription/patient/{patient_uuid}')
+
+    assert status == 200, body
+    prescriptions = body['data']
+    assert len(prescriptions) == prescription_count
+    assert all(len(p['medicines']) == 3 for p in prescriptions)
+    assert len(catalyst.db.ops('zcql')) <= 3
@@ -0,0 +1,71 @@
+import threading
+
+import main
+from tests.fake_catalyst import FakeZcql
+
+WORKERS = 40
+SAVES_PER_WORKER = 5
+OPENING_QUANTITY = 60
+UNITS_PER_SAVE = 3  # 'Once daily' for 3 days
+
+
+def _create_patient(catalyst):
+    status, body = catalyst.call('POST', '/add', {'Name': 'A', 'Phonenumber': '1', 'Gender': 'M', 'Age': 3})
+    assert status == 200, body
+    return catalyst.db.select('SELECT UUID FROM Patient')[0]['UUID']
+
+
+def _save_prescription(catalyst, patient_uuid):
+    return catalyst.call('POST', '/prescription/save', {
+        'PatientUUID': patient_uuid,
+        'medicines': [{'MedicineName': 'Hot', 'frequency': 'Once daily', 'Duration': '3'}],
+    })
+
+
+def test_concurrent_saves_never_overdraw_or_lose_a_deduction(catalyst):
+    patient_uuid = _create_patient(catalyst)
+    status, body = catalyst.call('POST', '/medicinestock/add', {'Name': 'Hot', 'Quantity': OPENING_QUANTITY})
+    assert status == 200, body
+    catalyst.db.latency = 0.001
+
+    statuses = []
+    statuses_lock = threading.Lock()
+
+    def worker():
+        for _ in range(SAVES_PER_WORKER):
+            status, _ = _save_prescription(catalyst, patient_uuid)
+            with statuses_lock:
+                statuses.append(status)
+
+    threads = [threading.Thread(target=worker) for _ in range(WORKERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    catalyst.db.latency = 0
+
+    saved = catalyst.db.select('SELECT COUNT(ROWID) AS n FROM Prescription')[0]['n']
+    assert set(statuses) <= {200, 409}
+    assert statuses.count(200) == saved
+    assert 0 < saved <= OPENING_QUANTITY // UNITS_PER_SAVE
+
+    stock_rows = main._fetch_stock_rows_by_rowid(FakeZcql(catalyst.db), [1])
+    balance = main._fetch_stock_balances(FakeZcql(catalyst.db), stock_rows, compact=False)['1']
+    assert balance == OPENING_QUANTITY - UNITS_PER_SAVE * saved
+    assert balance >= 0
+
+
+def test_ledger_replays_from_opening_quantity_after_compaction(catalyst):
+    patient_uuid = _create_patient(catalyst)
+    catalyst.call('POST', '/medicinestock/add', {'Name': 'Hot', 'Quantity': OPENING_QUANTITY})
+    for _ in range(4):
+        status, body = _save_prescription(catalyst, patient_uuid)
+        assert status == 200, body
+    status, body = catalyst.call('GET', '/medicinestock/all')
+    assert status == 200, body
+
+    stock = catalyst.db.select('SELECT Quantity, OpeningQuantity, LedgerRowId FROM MedicineStock')[0]
+    movements = catalyst.db.select('SELECT SUM(Delta) AS total FROM StockMovement')[0]['total']
+    assert stock['LedgerRowId'] is not None
+    assert stock['OpeningQuantity'] == OPENING_QUANTITY
+    assert stock['OpeningQuantity'] + movements == OPENING_QUANTITY - 4 * UNITS_PER_SAVE
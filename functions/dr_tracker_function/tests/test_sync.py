@@ -0,0 +1,12 @@
+def test_tombstones_carry_string_rowids(catalyst):
+    patient = catalyst.db.insert('Patient', [{'Name': 'A', 'Phonenumber': '1', 'UUID': 'p-1'}])[0]
+    status, body = catalyst.call('GET', '/sync/patient')
+    assert status == 200, body
+    token = body['data']['nextToken']
+
+    status, body = catalyst.call('DELETE', '/patient', query={'UUID': 'p-1'})
+    assert status == 200, body
+    status, body = catalyst.call('GET', '/sync/patient', query={'since': token})
+
+    assert status == 200, body
+    assert body['data']['deleted'] == [{'ROWID': str(patient['ROWID']), 'UUID': 'p-1'}]